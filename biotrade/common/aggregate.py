@@ -164,8 +164,11 @@ def agg_trade_eu_row(
         index = [country_group, "partner_code", "partner"] + index
         if "partner_code" not in df.columns:
             index.remove("partner_code")
-    # Aggregate
-    df_agg = df.groupby(index, dropna=False)[value_col].agg("sum").reset_index()
+    # Aggregate, observed=True keeps only the combinations present in the data
+    # when grouping columns are categorical
+    df_agg = df.groupby(index, dropna=False, observed=True, as_index=False)[
+        value_col
+    ].sum()
     # When aggregating over partner groups, rename country_group to partner
     if grouping_side == "partner":
         df_agg = df_agg.rename(columns={country_group: "partner"})
@@ -287,22 +290,24 @@ def nlargest(df, value_vars, time_vars=None, agg_groups=None, slice_groups=None,
     # Compute the sum within each group for each time period (such as each year)
     # Then compute the average for each group over the years
     if agg_groups is not None:
-        df_agg = df.groupby(agg_groups + time_vars)[value_vars].agg(sum)
+        df_agg = df.groupby(agg_groups + time_vars)[value_vars].agg("sum")
         df_agg = df_agg.groupby(agg_groups)[value_vars].agg("mean")
     else:
-        df_agg = df.groupby(time_vars)[value_vars].agg(sum)
-    # Sort rows by ascending slice_groups and descending first value column
+        df_agg = df.groupby(time_vars)[value_vars].agg("sum")
+    # Keep the n first rows of each slice group by rank of the first value
+    # column, then sort only these rows by ascending slice_groups and
+    # descending first value column
     if slice_groups is not None:
-        df_slice = (
-            df_agg.sort_values(
-                slice_groups + [value_vars[0]],
-                ascending=[True] * len(slice_groups) + [False],
-            )
-            .groupby(slice_groups)
-            .head(n)
+        rank = df_agg.groupby(slice_groups)[value_vars[0]].rank(
+            method="first", ascending=False
+        )
+        df_slice = df_agg[rank <= n].sort_values(
+            slice_groups + [value_vars[0]],
+            ascending=[True] * len(slice_groups) + [False],
         )
     else:
-        df_slice = df_agg.sort_values([value_vars[0]], ascending=False).head(n)
+        # Select the n largest rows without sorting the whole data frame
+        df_slice = df_agg.nlargest(n, value_vars[0])
     df_slice = df_slice.reset_index()
     return df_slice
 
@@ -242,13 +242,71 @@ def transform_comtrade_using_faostat_codes(
             "unit",
             "element",
         ]
-        df_agg = df.groupby(index, dropna=False)["value"].agg(sum).reset_index()
+        df_agg = df.groupby(index, dropna=False)["value"].agg("sum").reset_index()
         # Check that the Comtrade data didn't change after aggregation
         assert math.isclose(df.value.sum(), df_agg.value.sum())
         df = df_agg
     return df
 
 
+def comtrade_monthly_to_yearly(df_comtrade):
+    """Aggregate Comtrade monthly data to yearly data. For the last year of
+    each reporter, the value is estimated from the sum of the last 12 months.
+
+    :param data frame df_comtrade: monthly Comtrade data with faostat codes
+        and a period column in the YYYYMM format
+    :return data frame with the yearly value and the value_est column, the
+        estimate of the last year of each reporter and NaN for the other years
+
+    """
+    # Group by year and compute the sum of values for the 12 month in each year
+    index = [
+        "reporter_code",
+        "reporter",
+        "partner_code",
+        "partner",
+        "product_code",
+        "year",
+        "unit",
+        "element",
+    ]
+    df_comtrade_agg = df_comtrade.groupby(index, as_index=False)["value"].sum()
+    # The last year is not necessarily complete and it might differ by
+    # countries. For any country. Sum the values of the last 12 months instead.
+    # We need to go back a bit further , because in March of 2022, there might
+    # be advanced countries which reported January 2022, but other countries
+    # which still have their last reporting period as June 2021, or even
+    # further back in 2020.
+    df_comtrade = df_comtrade.copy()  # .query("year >= year.max() - 3").copy()
+    # Map the maximum period of each reporter back to the rows, instead of
+    # broadcasting it with transform
+    max_period = df_comtrade.groupby("reporter")["period"].max()
+    df_comtrade["max_period"] = df_comtrade["reporter"].map(max_period)
+    df_comtrade["last_month"] = df_comtrade["max_period"] % 100
+    df_comtrade["previous_year"] = df_comtrade["max_period"] // 100 - 1
+    # For the special case of December, last year stays the same
+    # last month is zero so that 0+1 becomes January
+    is_december = df_comtrade["last_month"] == 12
+    df_comtrade.loc[is_december, "previous_year"] = (
+        df_comtrade["max_period"] // 100
+    )
+    df_comtrade.loc[is_december, "last_month"] = 0
+    df_comtrade["max_minus_12"] = (
+        df_comtrade["previous_year"] * 100 + df_comtrade["last_month"] + 1
+    )
+    df_recent = df_comtrade.query("period >= max_minus_12").copy()
+    df_recent["year"] = df_recent["previous_year"] + 1
+    df_recent_agg = df_recent.groupby(index, as_index=False)["value"].sum()
+    df_recent_agg["value_est"] = df_recent_agg["value"]
+    # Combine the aggregated yearly values with the estimate for the last year.
+    # Stack the estimates first and keep them where both are available,
+    # instead of an outer join on all the index columns
+    df = pandas.concat(
+        [df_recent_agg, df_comtrade_agg], ignore_index=True
+    ).drop_duplicates(subset=index, keep="first")
+    return df
+
+
 def merge_faostat_comtrade(
     faostat_table,
     comtrade_table,
@@ -353,62 +411,20 @@ def merge_faostat_comtrade(
     if comtrade_table == "monthly":
         # 3. Aggregate Comtrade from monthly to yearly. For the last data point
         #    extrapolate to the current year based on values from the last 12 months
-        # Group by year and compute the sum of values for the 12 month in each year
-        index = [
-            "reporter_code",
-            "reporter",
-            "partner_code",
-            "partner",
-            "product_code",
-            "year",
-            "unit",
-            "element",
-        ]
-        df_comtrade_agg = df_comtrade.groupby(index)["value"].agg(sum)
-        # The last year is not necessarily complete and it might differ by
-        # countries. For any country. Sum the values of the last 12 months instead.
-        # We need to go back a bit further , because in March of 2022, there might
-        # be advanced countries which reported January 2022, but other countries
-        # which still have their last reporting period as June 2021, or even
-        # further back in 2020.
-        df_comtrade = (
-            df_comtrade.copy()
-        )  # .query("year >= year.max() - 3").copy()
-        df_comtrade["max_period"] = df_comtrade.groupby("reporter")[
-            "period"
-        ].transform(max)
-        df_comtrade["last_month"] = df_comtrade["max_period"] % 100
-        df_comtrade["previous_year"] = df_comtrade["max_period"] // 100 - 1
-        # For the special case of December, last year stays the same
-        # last month is zero so that 0+1 becomes January
-        is_december = df_comtrade["last_month"] == 12
-        df_comtrade.loc[is_december, "previous_year"] = (
-            df_comtrade["max_period"] // 100
-        )
-        df_comtrade.loc[is_december, "last_month"] = 0
-        df_comtrade["max_minus_12"] = (
-            df_comtrade["previous_year"] * 100 + df_comtrade["last_month"] + 1
-        )
-        df_recent = df_comtrade.query("period >= max_minus_12").copy()
-        df_recent["year"] = df_recent["previous_year"] + 1
-        df_recent_agg = df_recent.groupby(index)["value"].agg(value_est=sum)
-        # Combine the aggregated yearly values with the estimate for the last year
-        df = pandas.concat(
-            [df_comtrade_agg, df_recent_agg], axis=1
-        ).reset_index()
+        df = comtrade_monthly_to_yearly(df_comtrade)
     else:
         # Add column value estimation with nan values since yearly data are not estimated and drop column period
         df = df_comtrade
         df["value_est"] = np.nan
         df.drop(columns="period", inplace=True)
     # Replace value by the estimate "value_est" where it is defined
-    selector = ~df.value_est.isna()
-    df.loc[selector, "value"] = df.loc[selector, "value_est"]
+    selector = df["value_est"].notna().to_numpy()
+    df["value"] = np.where(
+        selector, df["value_est"].to_numpy(), df["value"].to_numpy()
+    )
     df.drop(columns="value_est", inplace=True)
     # Add the column flag for the estimates
-    df["flag"] = np.nan
-    df.loc[selector, "flag"] = "estimate"
-    df.loc[~selector, "flag"] = ""
+    df["flag"] = np.where(selector, "estimate", "").astype(object)
     if comtrade_code is None:
         # Add FAOSTAT product names
         df = df.merge(product_names, on="product_code")
@@ -146,9 +146,13 @@ def compute_share_by_partners(
     # Compute the proportion among all trade partners
     locator = df[value] > threshold
     df_out = df.loc[locator].copy()
-    df_out["imp_share_by_p"] = df_out.groupby(index)[value].transform(
-        lambda x: x / x.sum()
-    )
+    # Total by group, merged back on the index columns and divided as arrays
+    df_total = df_out.groupby(index, observed=True, sort=False, as_index=False)[
+        value
+    ].sum()
+    df_total.rename(columns={value: "imp_total"}, inplace=True)
+    total = df_out[index].merge(df_total, on=index, how="left")["imp_total"]
+    df_out["imp_share_by_p"] = df_out[value].to_numpy() / total.to_numpy()
     return df_out
 
 
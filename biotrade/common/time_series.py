@@ -450,9 +450,10 @@ def optimize_breakpoints(
                     mk_results.slope,
                     mk_results.intercept,
                 ]
-        # Return values related to most recent year at disposal
+        # Return values related to most recent year at disposal, selected on the year
+        # column without sorting df again
         if last_value:
-            df = df.sort_values(by="year", ascending=False)[0:1]
+            df = df.iloc[[df["year"].to_numpy().argmax()]]
     else:
         df = pd.DataFrame(
             columns=[
@@ -569,8 +570,9 @@ def segmented_regression(
     )
     # Perform multiprocessing
     if multi_process:
-        # Define data groups
-        groups = [groupby.get_group(group) for group in groupby.groups]
+        # Define data groups, split in a single pass over the data instead of
+        # looking up each group
+        groups = [group for _, group in groupby]
         with Pool() as pool:
             # Launch parallel jobs using several cores depending on the machine
             segmented_regression = pool.map(
@@ -677,7 +679,9 @@ def calculate_changes(
     )
     df["absolute_change"] = df[value_column] - df["average_value"]
     # 0/0 and float/0 treated as NaN
-    df["relative_change"].replace([np.inf, -np.inf], np.nan, inplace=True)
+    df["relative_change"] = df["relative_change"].where(
+        np.isfinite(df["relative_change"])
+    )
     # Define 2 new columns with the lower and upper years of the average value
     if year_range:
         df["year_range_lower"] = year_range[0]
@@ -783,7 +787,8 @@ def relative_absolute_change(
                     continue
                 groupby_column_list.append(column)
     # Define groups with respect to calculate the relative and absolute change of values in time
-    groupby = df.groupby(groupby_column_list, as_index=False)
+    # (observed=True avoids empty groups when grouping columns are categorical)
+    groupby = df.groupby(groupby_column_list, as_index=False, observed=True)
     # Allocate df reshaped to return
     df_change = pd.DataFrame()
     # Column list to perform calculations
@@ -809,8 +814,9 @@ def relative_absolute_change(
     )
     # Perform multiprocessing
     if multi_process:
-        # Define data groups
-        groups = [groupby.get_group(group) for group in groupby.groups]
+        # Define data groups, split in a single pass over the data instead of
+        # looking up each group
+        groups = [group for _, group in groupby]
         with Pool() as pool:
             # Launch parallel jobs using several cores depending on the machine
             relative_absolute = pool.map(
@@ -35,6 +35,9 @@ Display the list of EU countries names in the FAOSTAT data
     >>> faostat.country_groups.eu_country_names
 
 """
+# Built-in modules
+from functools import cached_property
+
 # Third party modules
 import pandas
 
@@ -76,9 +79,10 @@ class Faostat:
         if not self.data_dir.exists():
             self.data_dir.mkdir()
 
-    @property
+    @cached_property
     def country_groups(self):
         """Identify reporter and partner countries and regions"""
+        # Cached, so that the csv file of the country groups is read only once
         return CountryGroups(self)
 
     @property
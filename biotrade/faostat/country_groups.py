@@ -15,6 +15,10 @@ Unit D1 Bioeconomy.
 # Third party modules
 import pandas
 
+# Largest Faostat code of a country. Codes from 1000 identify country groups such as
+# continents, regions or economic groups
+COUNTRY_CODE_MAX = 999
+
 
 class CountryGroups(object):
     """
@@ -40,6 +44,8 @@ class CountryGroups(object):
         self.parent = parent
         # Directories #
         self.config_data_dir = self.parent.config_data_dir
+        # Table read from the csv file at the first call of the df property
+        self._df = None
 
     @property
     def df(self):
@@ -51,16 +57,19 @@ class CountryGroups(object):
             >>> df = faostat.country_groups.df
 
         """
-        path = self.config_data_dir / "faostat_country_groups.csv"
-        df = pandas.read_csv(path)
-        # Force country codes to be integers instead of floats.
-        # Note, we are not using the nullable integer data type Int64 with capital I.
-        # https://pandas.pydata.org/pandas-docs/stable/user_guide/integer_na.html
-        # Preferring to keep the standard integer type and -1 for missing codes.
-        # TODO: remove this behaviour NA should be kept as NA
-        df["faost_code"] = df["faost_code"].fillna(-1).astype("int")
-        df["un_code"] = df["un_code"].fillna(-1).astype("int")
-        return df
+        if self._df is None:
+            path = self.config_data_dir / "faostat_country_groups.csv"
+            df = pandas.read_csv(path)
+            # Force country codes to be integers instead of floats.
+            # Note, we are not using the nullable integer data type Int64 with capital I.
+            # https://pandas.pydata.org/pandas-docs/stable/user_guide/integer_na.html
+            # Preferring to keep the standard integer type and -1 for missing codes.
+            # TODO: remove this behaviour NA should be kept as NA
+            df["faost_code"] = df["faost_code"].fillna(-1).astype("int")
+            df["un_code"] = df["un_code"].fillna(-1).astype("int")
+            self._df = df
+        # Return a copy so that callers can modify it without changing the cached table
+        return self._df.copy()
 
     @property
     def eu_country_names(self):
@@ -302,12 +302,28 @@ class DatabaseFaostat(Database):
         )
         return table
 
-    def read_sql_query(self, stmt):
-        """A wrapper around pandas.read_sql_query"""
+    def read_sql_query(self, stmt, chunksize=None):
+        """A wrapper around pandas.read_sql_query
+
+        :param stmt: SQL Alchemy select statement
+        :param int chunksize: if given, return an iterator of data frames
+            with at most chunksize rows each instead of a single data frame
+        """
+        if chunksize is not None:
+            return self.read_sql_query_chunks(stmt, chunksize)
         with self.engine.connect() as conn:
             df = pandas.read_sql_query(stmt, conn)
         return df
 
+    def read_sql_query_chunks(self, stmt, chunksize):
+        """Generator of data frames returned by pandas.read_sql_query
+
+        The connection stays open until all chunks have been read.
+        """
+        with self.engine.connect() as conn:
+            for df in pandas.read_sql_query(stmt, conn, chunksize=chunksize):
+                yield df
+
     def select(
         self,
         table,
@@ -320,6 +336,8 @@ class DatabaseFaostat(Database):
         product_code=None,
         period_start=None,
         period_end=None,
+        reporter_code_max=None,
+        chunksize=None,
     ):
         """Select faostat data for the given arguments
 
@@ -333,6 +351,12 @@ class DatabaseFaostat(Database):
         :param list or int or str product_code: list of product codes
         :param int period_start: integer for filtering data from start year
         :param int period_end: integer for filtering data up to end year
+        :param int reporter_code_max: integer for filtering reporter codes up
+            to this value, for example COUNTRY_CODE_MAX (999) keeps only country
+            reporters
+        :param int chunksize: if given, return an iterator of data frames
+            with at most chunksize rows each, to filter large tables chunk by
+            chunk instead of loading them at once
         :return: A data frame of trade flows
 
         Note that the search for reporter and partner will be based on perfect
@@ -419,6 +443,19 @@ class DatabaseFaostat(Database):
             >>> veg_oil = db.select(table="crop_trade",
             >>>                     product = products_of_interest)
 
+        Select crop production by chunks of 500 000 rows and keep only
+        country reporters
+
+            >>> chunks = db.select(table="crop_production", chunksize=500_000)
+            >>> cp = pandas.concat([c[c["reporter_code"] < 1000] for c in chunks])
+
+        Select the same country reporters with the filter applied by the
+        database, without transferring the rows of country groups
+
+            >>> from biotrade.faostat.country_groups import COUNTRY_CODE_MAX
+            >>> cp2 = db.select(table="crop_production",
+            >>>                 reporter_code_max=COUNTRY_CODE_MAX)
+
         """
         table = self.tables[table]
         # Change character or integer arguments to lists suitable for a
@@ -457,8 +494,11 @@ class DatabaseFaostat(Database):
             stmt = stmt.where(table.c.period >= period_start)
         if period_end is not None:
             stmt = stmt.where(table.c.period <= period_end)
-        # Query the database and return a data frame
-        df = self.read_sql_query(stmt)
+        if reporter_code_max is not None:
+            stmt = stmt.where(table.c.reporter_code <= reporter_code_max)
+        # Query the database and return a data frame (or an iterator of data
+        # frames when chunksize is given)
+        df = self.read_sql_query(stmt, chunksize=chunksize)
         return df
 
     def agg_reporter_partner_eu_row(
@@ -99,19 +99,10 @@ def value_quantity_share(df, variable, df_relationship, index_list):
     index_list.remove("product")
     index_list.append("parent")
 
-    # new dataframe grouped by index_list with sum_children column
-    # corresponding to the sum of all children products
-    df_sum_parent = (
-        df_share.groupby(index_list).agg(sum_children=("value", sum)).reset_index()
-    )
-
-    # merge the two dataframe based on index_list
-    df_share = df_share.merge(
-        df_sum_parent,
-        how="left",
-        left_on=index_list,
-        right_on=index_list,
-    )
+    # sum_children column corresponding to the sum of all children
+    # products, broadcast to the rows of each group in a single pass
+    # instead of aggregating and merging back on index_list
+    df_share["sum_children"] = df_share.groupby(index_list)["value"].transform("sum")
 
     # add new column computing the value/quantity share as value column
     # divided by the sum children column
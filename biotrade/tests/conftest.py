@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixtures shared by the tests
+
+Copyright (c) 2023 European Union
+Licenced under the MIT licence
+"""
+
+import pandas
+import pytest
+from biotrade.faostat import faostat
+from biotrade.faostat.database import DatabaseFaostatSqlite
+
+
+@pytest.fixture
+def faostat_sqlite(tmp_path):
+    """Faostat SQLite database in a temporary folder, with a small crop
+    production table of countries and country groups"""
+
+    class DatabaseFaostatTmp(DatabaseFaostatSqlite):
+        database_url = f"sqlite:///{tmp_path}/faostat.db"
+
+    db = DatabaseFaostatTmp(faostat)
+    reporter_codes = [2, 41, 351, 999, 1000, 5000]
+    df = pandas.DataFrame(
+        [
+            (reporter_code, product_code, year)
+            for reporter_code in reporter_codes
+            for product_code in [15, 56]
+            for year in [2019, 2020]
+        ],
+        columns=["reporter_code", "product_code", "year"],
+    )
+    df["reporter"] = "r" + df["reporter_code"].astype(str)
+    df["product"] = "p" + df["product_code"].astype(str)
+    df["element_code"] = 5510
+    df["element"] = "production"
+    df["period"] = df["year"]
+    df["unit"] = "t"
+    df["value"] = [0.0 if i % 5 == 0 else i * 1.1 for i in range(len(df))]
+    df["flag"] = ""
+    db.append(df, "crop_production")
+    yield db
+    db.engine.dispose()
@@ -15,6 +15,7 @@ Licenced under the MIT licence
 import pandas
 from pandas.testing import assert_frame_equal
 from pandas.testing import assert_series_equal
+from biotrade.common.aggregate import nlargest
 from biotrade.faostat.aggregate import agg_trade_eu_row, agg_by_country_groups
 
 
@@ -121,3 +122,68 @@ def test_agg_trade_eu_row_with_eu_countries():
     dfp_output = agg_trade_eu_row(df, grouping_side="partner")
     assert_series_equal(dfp_output["value"], dfp_expected["value"])
     assert_frame_equal(dfp_output, dfp_expected)
+
+
+def test_agg_trade_eu_row_with_categories():
+    df = pandas.DataFrame(
+        {
+            "reporter": ["Italy", "Italy", "Italy", "A"],
+            "partner": ["Y", "France", "France", "Y"],
+            "element": ["import_value"] * 4,
+            "value": [1, 2, 1, 2],
+        }
+    )
+    for col in ["reporter", "partner", "element"]:
+        df[col] = df[col].astype("category")
+    dfp_expected = pandas.DataFrame(
+        {
+            "reporter": ["A", "Italy", "Italy"],
+            "partner": ["row", "eu", "row"],
+            "element": ["import_value"] * 3,
+            "value": [2, 3, 1],
+        }
+    ).astype({"reporter": "category", "element": "category"})
+    dfp_output = agg_trade_eu_row(df, grouping_side="partner")
+    # Only observed combinations of the categories are returned
+    assert_series_equal(dfp_output["value"], dfp_expected["value"])
+    assert_frame_equal(dfp_output, dfp_expected)
+
+
+def test_nlargest_with_ties():
+    df = pandas.DataFrame(
+        {
+            "reporter": ["A", "A", "B", "C", "D", "A", "B"],
+            "element": ["x", "x", "x", "x", "x", "y", "y"],
+            "year": [2020, 2021, 2020, 2020, 2020, 2020, 2020],
+            "value": [4.0, 6.0, 3.0, 3.0, 1.0, 2.0, 4.0],
+        }
+    )
+    # B and C are tied in element x, the first one in the reporter order is kept
+    dfp_expected = pandas.DataFrame(
+        {
+            "element": ["x", "x", "y", "y"],
+            "reporter": ["A", "B", "B", "A"],
+            "value": [5.0, 3.0, 4.0, 2.0],
+        }
+    )
+    dfp_output = nlargest(
+        df, value_vars="value", agg_groups="reporter", slice_groups="element", n=2
+    )
+    # The order of the grouping columns is not defined
+    dfp_output = dfp_output[["element", "reporter", "value"]]
+    assert_frame_equal(dfp_output, dfp_expected)
+    # Without slice groups, the n largest rows overall
+    dfp_expected = pandas.DataFrame(
+        {
+            "element": ["x", "y", "x"],
+            "reporter": ["A", "B", "B"],
+            "value": [5.0, 4.0, 3.0],
+        }
+    )
+    dfp_output = nlargest(
+        df, value_vars="value", agg_groups=["element", "reporter"], n=3
+    ).reset_index(drop=True)
+    assert_frame_equal(dfp_output, dfp_expected)
+    # Without any group, the years with the largest sums
+    dfp_expected = pandas.DataFrame({"year": [2020], "value": [17.0]})
+    assert_frame_equal(nlargest(df, value_vars="value", n=1), dfp_expected)
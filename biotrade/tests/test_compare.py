@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test functions from:
+
+    - common/compare.py
+
+Copyright (c) 2023 European Union
+Licenced under the MIT licence
+"""
+
+import numpy as np
+import pandas
+from pandas.testing import assert_frame_equal
+from biotrade.common.compare import comtrade_monthly_to_yearly
+
+INDEX = [
+    "reporter_code",
+    "reporter",
+    "partner_code",
+    "partner",
+    "product_code",
+    "year",
+    "unit",
+    "element",
+]
+
+
+def previous_monthly_to_yearly(df_comtrade):
+    """Previous implementation, with an outer join of the yearly sums and of
+    the estimates"""
+    df_comtrade_agg = df_comtrade.groupby(INDEX)["value"].agg("sum")
+    df_comtrade = df_comtrade.copy()
+    df_comtrade["max_period"] = df_comtrade.groupby("reporter")[
+        "period"
+    ].transform("max")
+    df_comtrade["last_month"] = df_comtrade["max_period"] % 100
+    df_comtrade["previous_year"] = df_comtrade["max_period"] // 100 - 1
+    is_december = df_comtrade["last_month"] == 12
+    df_comtrade.loc[is_december, "previous_year"] = (
+        df_comtrade["max_period"] // 100
+    )
+    df_comtrade.loc[is_december, "last_month"] = 0
+    df_comtrade["max_minus_12"] = (
+        df_comtrade["previous_year"] * 100 + df_comtrade["last_month"] + 1
+    )
+    df_recent = df_comtrade.query("period >= max_minus_12").copy()
+    df_recent["year"] = df_recent["previous_year"] + 1
+    df_recent_agg = df_recent.groupby(INDEX)["value"].agg(value_est="sum")
+    return pandas.concat(
+        [df_comtrade_agg, df_recent_agg], axis=1
+    ).reset_index()
+
+
+def estimated_values(df):
+    """Value replaced by the estimate where it is defined, and estimate flag,
+    as computed by merge_faostat_comtrade"""
+    df = df.assign(
+        value=df["value_est"].fillna(df["value"]),
+        flag=np.where(df["value_est"].notna(), "estimate", ""),
+    )
+    return (
+        df.drop(columns="value_est").sort_values(INDEX).reset_index(drop=True)
+    )
+
+
+def test_comtrade_monthly_to_yearly():
+    rng = np.random.default_rng(1)
+    # Reporter A reports until March 2022, reporter B until December 2021
+    months = [y * 100 + m for y in [2019, 2020, 2021] for m in range(1, 13)]
+    rows = [
+        (reporter_code, reporter, partner_code, partner, period)
+        for reporter_code, reporter, last_period in [
+            (1, "A", 202203),
+            (2, "B", 202112),
+        ]
+        for partner_code, partner in [(10, "X"), (11, "Y")]
+        for period in months + [202201, 202202, 202203]
+        if period <= last_period
+    ]
+    df = pandas.DataFrame(
+        rows,
+        columns=[
+            "reporter_code",
+            "reporter",
+            "partner_code",
+            "partner",
+            "period",
+        ],
+    )
+    # Some months are not reported
+    df = df[rng.random(len(df)) > 0.2].reset_index(drop=True)
+    df["year"] = df["period"] // 100
+    df["product_code"] = 15
+    df["unit"] = "kg"
+    df["element"] = "import_quantity"
+    df["value"] = rng.random(len(df)) * 1000
+    result = comtrade_monthly_to_yearly(df)
+    expected = previous_monthly_to_yearly(df)
+    # Reporter A estimates 2022 from April 2021 to March 2022. The last 12
+    # months of reporter B, which reported until December 2021, are also 2022
+    estimates = result[result["value_est"].notna()]
+    assert set(zip(estimates["reporter"], estimates["year"])) == {
+        ("A", 2022),
+        ("B", 2022),
+    }
+    assert_frame_equal(
+        estimated_values(result), estimated_values(expected), check_exact=True
+    )
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test functions from:
+
+    - biotrade/faostat/country_groups.py
+
+Copyright (c) 2023 European Union
+Licenced under the MIT licence
+"""
+
+import pandas
+from biotrade.faostat import Faostat
+
+
+def test_country_groups_read_once(monkeypatch):
+    read_csv = pandas.read_csv
+    calls = []
+
+    def counting_read_csv(path, *args, **kwargs):
+        calls.append(path)
+        return read_csv(path, *args, **kwargs)
+
+    monkeypatch.setattr(pandas, "read_csv", counting_read_csv)
+    faostat = Faostat()
+    df = faostat.country_groups.df
+    assert faostat.country_groups is faostat.country_groups
+    # Modifying the returned data frame does not change the cached table
+    df["faost_code"] = -2
+    assert (faostat.country_groups.df["faost_code"] != -2).all()
+    assert "France" in faostat.country_groups.eu_country_names
+    assert len(calls) == 1
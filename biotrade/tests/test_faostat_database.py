@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test functions from:
+
+    - faostat/database.py
+
+Copyright (c) 2023 European Union
+Licenced under the MIT licence
+"""
+
+import pandas
+from pandas.testing import assert_frame_equal
+from sqlalchemy import select
+from biotrade.faostat.country_groups import COUNTRY_CODE_MAX
+
+
+def test_select_reporter_code_max(faostat_sqlite):
+    df_all = faostat_sqlite.select("crop_production")
+    df = faostat_sqlite.select(
+        "crop_production", product_code=15, reporter_code_max=COUNTRY_CODE_MAX
+    )
+    # Same rows as filtering the whole table in pandas
+    df_expected = df_all[
+        (df_all["reporter_code"] < 1000) & (df_all["product_code"] == 15)
+    ].reset_index(drop=True)
+    assert set(df["reporter_code"]) == {2, 41, 351, 999}
+    assert_frame_equal(df, df_expected)
+
+
+def test_read_sql_query_chunks(faostat_sqlite):
+    stmt = select(faostat_sqlite.tables["crop_production"])
+    df_expected = faostat_sqlite.read_sql_query(stmt)
+    chunks = list(faostat_sqlite.read_sql_query(stmt, chunksize=5))
+    # 24 rows in chunks of at most 5 rows
+    assert [len(chunk) for chunk in chunks] == [5, 5, 5, 5, 4]
+    assert_frame_equal(pandas.concat(chunks, ignore_index=True), df_expected)
+    # The select method returns the same chunks
+    chunks = faostat_sqlite.select("crop_production", chunksize=5)
+    assert_frame_equal(pandas.concat(chunks, ignore_index=True), df_expected)
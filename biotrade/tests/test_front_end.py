@@ -11,9 +11,14 @@ Copyright (c) 2023 European Union
 Licenced under the MIT licence
 """
 
+import sys
+from types import SimpleNamespace
 import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 from pandas.testing import assert_series_equal
+import scripts.front_end.functions as front_end_functions
+from biotrade.faostat import faostat
 from scripts.front_end.functions import aggregated_data, reporter_iso_codes
 
 
@@ -100,3 +105,272 @@ def test_aggregated_data():
         expected_output["value"],
     )
     assert_frame_equal(result, expected_output)
+
+
+def test_aggregated_data_order_and_sum():
+    # Float values summed like Series.sum(min_count=1), with the rows not aggregated
+    # first, then the reporter side and the partner side groups in sorted order
+    nan = float("nan")
+    df = pd.DataFrame(
+        {
+            "source": ["a"] * 8,
+            "reporter_code": [1, 6, 2, 5, 3, 4, 5, 1],
+            "partner_code": [7, 7, 7, 1, 7, 3, 2, 6],
+            "reporter": ["A", "F", "B", "E", "C", "D", "E", "A"],
+            "partner": ["G", "G", "G", "A", "G", "C", "B", "F"],
+            "product_code": [11, 11, 11, 12, 11, 10, 12, 10],
+            "element_code": [16] * 8,
+            "year": [2020] * 8,
+            "period": [2020] * 8,
+            "unit": ["kg"] * 8,
+            "value": [0.1, 1.0, 0.2, 0.3, 0.3, nan, nan, 0.5],
+        }
+    )
+    groupby_cols = ["product_code", "element_code", "year", "unit"]
+    expected_output = pd.DataFrame(
+        {
+            "source": ["a"] * 5,
+            "reporter_code": [6, 99, 99, 4, 5],
+            "partner_code": [7, 6, 7, 99, 99],
+            "reporter": ["F", "Aggregated", "Aggregated", "D", "E"],
+            "partner": ["G", "F", "G", "Aggregated", "Aggregated"],
+            "product_code": [11, 10, 11, 10, 12],
+            "element_code": [16] * 5,
+            "year": [2020] * 5,
+            "period": [2020] * 5,
+            "unit": ["kg"] * 5,
+            "value": [1.0, 0.5, 0.1 + 0.2 + 0.3, nan, 0.3],
+        }
+    )
+    result = aggregated_data(df, [1, 2, 3], 99, "Aggregated", groupby_cols=groupby_cols)
+    assert_frame_equal(result, expected_output, check_exact=True)
+
+
+def test_cached_merge_faostat_comtrade_data(tmp_path, monkeypatch):
+    df = pd.DataFrame({"product_code": [1, 2], "value": [10.0, 20.0]})
+    calls = []
+
+    def fake_merge(faostat_code, comtrade_regulation, aggregate):
+        calls.append(faostat_code)
+        return df
+
+    # Number of rows, most recent year and sum of values of the tables
+    state = {"crop_trade": (10, 2021, 1.0), "yearly": (20, 2022, 2.0, 3.0)}
+    monkeypatch.setenv("BIOTRADE_CACHE", "True")
+    monkeypatch.setattr(front_end_functions, "data_dir", tmp_path)
+    monkeypatch.setattr(front_end_functions, "merge_faostat_comtrade_data", fake_merge)
+    monkeypatch.setattr(
+        front_end_functions, "table_state", lambda db, table: state[table]
+    )
+    regulation = pd.DataFrame({"product_code": ["a"], "comtrade_code": [1]})
+    cached_merge = front_end_functions.cached_merge_faostat_comtrade_data
+    result_1 = cached_merge([2, 1], regulation, aggregate=False)
+    # Same arguments in a different order are read from the cache file
+    result_2 = cached_merge([1, 2], regulation, aggregate=False)
+    assert len(calls) == 1
+    assert_frame_equal(result_1, df)
+    assert_frame_equal(result_2, df)
+    # Different arguments are merged again
+    cached_merge([1], regulation, aggregate=False)
+    assert len(calls) == 2
+    # Same arguments are merged again after an update of the db
+    state["yearly"] = (21, 2023, 2.5, 3.5)
+    cached_merge([1, 2], regulation, aggregate=False)
+    assert len(calls) == 3
+    # And after a change of the code
+    monkeypatch.setattr(front_end_functions, "_code_version", lambda: "new")
+    cached_merge([1, 2], regulation, aggregate=False)
+    assert len(calls) == 4
+    # The cache is not used without the env variable
+    monkeypatch.delenv("BIOTRADE_CACHE")
+    cached_merge([1, 2], regulation, aggregate=False)
+    assert len(calls) == 5
+
+
+def test_save_dataset(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setenv("FRONT_END_DATA", str(tmp_path))
+    df = pd.DataFrame(
+        {
+            "source": ["a", "a", "b"],
+            "element": ["x", "y", "x"],
+            "value": [1.0, 2.0, 3.0],
+        }
+    )
+    front_end_functions.save_dataset(df, "dataset")
+    # One folder for each source, then for each element
+    path = tmp_path / "dataset"
+    assert sorted(p.name for p in path.iterdir()) == ["source=a", "source=b"]
+    assert sorted(p.name for p in (path / "source=a").iterdir()) == [
+        "element=x",
+        "element=y",
+    ]
+    result = pd.read_parquet(path / "source=a")
+    assert sorted(result["value"]) == [1.0, 2.0]
+
+
+def test_save_dataset_without_pyarrow(tmp_path, monkeypatch):
+    # A None module makes the import fail as if pyarrow was not installed
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setenv("FRONT_END_DATA", str(tmp_path))
+    df = pd.DataFrame({"source": ["a"], "element": ["x"], "value": [1.0]})
+    with pytest.raises(ImportError, match=r"biotrade\[parquet\]"):
+        front_end_functions.save_dataset(df, "dataset")
+
+
+def test_select_country_data(faostat_sqlite, monkeypatch):
+    monkeypatch.setattr(
+        front_end_functions, "faostat", SimpleNamespace(db=faostat_sqlite)
+    )
+    df_all = faostat_sqlite.select("crop_production", product_code=[15, 56])
+    for drop_zero_values in [False, True]:
+        # Previous implementation, selecting all the rows then filtering them
+        df_expected = df_all[df_all["reporter_code"] < 1000]
+        if drop_zero_values:
+            df_expected = df_expected[df_expected["value"] != 0]
+        # Small chunks, so that several of them are filtered and concatenated
+        df = front_end_functions.select_country_data(
+            "crop_production",
+            drop_zero_values=drop_zero_values,
+            chunksize=5,
+            product_code=[15, 56],
+        )
+        assert_frame_equal(df, df_expected.reset_index(drop=True))
+
+
+def previous_reporter_iso_codes(df, country_codes):
+    """Previous implementation of reporter_iso_codes, merging the country groups"""
+    reporter = pd.read_csv(
+        faostat.config_data_dir / "faostat_country_groups.csv",
+        usecols=["faost_code", "iso3_code"],
+    )
+    for col in [col for col in ["reporter_code", "partner_code"] if col in df.columns]:
+        df = df.merge(reporter, how="left", left_on=col, right_on="faost_code")
+        df[col] = df["iso3_code"]
+        df = df.drop(columns=["faost_code", "iso3_code"])
+        df = df[df[col].isin(country_codes)]
+    if "partner_code" in df.columns:
+        df = df[df["reporter_code"] != df["partner_code"]]
+    return df.reset_index(drop=True)
+
+
+def test_reporter_iso_codes_lookup(tmp_path, monkeypatch):
+    # GISCO list without Taiwan, codes of country groups have no iso3 code
+    country_codes = ["AFG", "ALB", "BRA", "CHN", "HKG"]
+    gisco = pd.DataFrame({"ISO3_CODE": country_codes})
+    gisco.to_csv(tmp_path / "GISCO_CNTR_LIST.txt", sep=";", index=False)
+    monkeypatch.setattr(front_end_functions, "data_dir", tmp_path)
+    front_end_functions.iso3_codes_lookup.cache_clear()
+    df = pd.DataFrame(
+        {
+            "reporter_code": [2, 41, 214, 351, 3, 21, 5000, 96, 41],
+            "partner_code": [21, 2, 41, 3, 3, 41, 2, 41, 41],
+            "value": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0],
+        }
+    )
+    try:
+        # Integer codes gathered by position, float codes mapped, and production
+        # data without partner codes
+        for df_test in [
+            df,
+            df.astype({"reporter_code": float, "partner_code": float}),
+            df.drop(columns="partner_code"),
+        ]:
+            assert_frame_equal(
+                reporter_iso_codes(df_test),
+                previous_reporter_iso_codes(df_test, country_codes),
+            )
+    finally:
+        front_end_functions.iso3_codes_lookup.cache_clear()
+
+
+def test_drop_zero_nan_values():
+    df = pd.DataFrame(
+        {
+            "reporter_code": [1, 2, 3, 4],
+            "value": [0.0, float("nan"), 3.0, 4.0],
+            "value_2": [1.0, 2.0, 0.0, 4.0],
+        }
+    )
+    result = front_end_functions.drop_zero_nan_values(df, ["value"])
+    assert result["reporter_code"].tolist() == [3, 4]
+    result = front_end_functions.drop_zero_nan_values(df, ["value", "value_2"])
+    assert result["reporter_code"].tolist() == [4]
+
+
+def test_downcast_numeric_columns():
+    df = pd.DataFrame(
+        {
+            "reporter_code": [1, 2],
+            "partner_code": ["AFG", "ALB"],
+            "year": [2020, 2021],
+            "value": [2512345.6, 123456789.0],
+        }
+    )
+    result = front_end_functions.downcast_numeric_columns(df)
+    assert result["reporter_code"].dtype == "int32"
+    assert result["year"].dtype == "int16"
+    # String codes and values are left as they are
+    assert result["partner_code"].dtype == object
+    assert_series_equal(result["value"], df["value"])
+
+
+def test_annual_variation_trade_files(tmp_path, monkeypatch):
+    from scripts.front_end import annual_variation_trade_quantity_value
+
+    # Comtrade export values are missing from the trade data
+    df = pd.DataFrame(
+        {
+            "source": ["faostat"] * 4 + ["comtrade"] * 3,
+            "reporter_code": [1, 1, 2, 2, 1, 2, 1],
+            "reporter": ["France", "France", "Brazil", "Brazil"]
+            + ["France", "Brazil", "France"],
+            "partner_code": [2, 2, 1, 1, 2, 1, 2],
+            "partner": ["Brazil", "Brazil", "France", "France"]
+            + ["Brazil", "France", "Brazil"],
+            "product_code": [11] * 7,
+            "product": ["11"] * 7,
+            "element_code": [1] * 7,
+            "element": ["import_quantity", "import_value"]
+            + ["export_quantity", "export_value"]
+            + ["import_quantity", "export_quantity", "import_value"],
+            "year": [2020] * 7,
+            "period": [2020] * 7,
+            "unit": ["kg"] * 7,
+            "flag": [""] * 7,
+            "value": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+        }
+    )
+    monkeypatch.setenv("FRONT_END_DATA", str(tmp_path))
+    monkeypatch.setattr(front_end_functions, "cached_regulation_trade_data", lambda: df)
+    monkeypatch.setattr(
+        front_end_functions,
+        "reporter_iso_codes",
+        lambda df: df.assign(
+            reporter_code=df["reporter"].str[:3], partner_code=df["partner"].str[:3]
+        ),
+    )
+    annual_variation_trade_quantity_value.main()
+    # All the files are saved, the missing groups with the header only
+    file_names = {path.name for path in tmp_path.iterdir()}
+    assert file_names == {
+        f"{source}{value}_annual_variation{eu_row}{mf}.csv"
+        for source in ["faostat", "comtrade"]
+        for value in ["", "_value"]
+        for eu_row in ["", "_eu_row"]
+        for mf in ["", "_mf"]
+    }
+    for file_name in [
+        "comtrade_value_annual_variation_mf.csv",
+        "comtrade_value_annual_variation_eu_row_mf.csv",
+    ]:
+        df_missing = pd.read_csv(tmp_path / file_name)
+        assert df_missing.empty
+        assert df_missing.columns.tolist() == [
+            "reporter_code",
+            "partner_code",
+            "product_code",
+            "period",
+            "value",
+            "unit",
+        ]
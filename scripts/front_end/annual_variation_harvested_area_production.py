@@ -12,61 +12,77 @@ Script made to export data related to harvested area/production of countries ass
 def main():
     from scripts.front_end.functions import (
         main_product_list,
+        cached_select_country_data,
+        FRANCE_TERRITORY_CODES,
         aggregated_data,
+        country_names,
+        downcast_numeric_columns,
         reporter_iso_codes,
-        replace_zero_with_nan_values,
+        drop_zero_nan_values,
         save_file,
     )
-    from biotrade.faostat import faostat
+    from concurrent.futures import ThreadPoolExecutor
     import pandas as pd
 
     # Obtain the main product codes
     main_product_list = main_product_list(
         ["crop_production", "forestry_production"]
     )
-    # Select quantities from Faostat db for crop data for all countries (code < 1000)
-    crop_data = faostat.db.select(
-        table="crop_production",
-        product_code=main_product_list,
-        element=["production", "area_harvested", "stocks"],
-    )
-    # Select wood production data
-    wood_data = faostat.db.select(
-        table="forestry_production",
-        product_code=main_product_list,
-        element=["production"],
-    )
-    # Merge data
-    crop_data = pd.concat([crop_data, wood_data], ignore_index=True)
-    crop_data = crop_data[crop_data["reporter_code"] < 1000]
-    # Aggregate french territories values to France and add them to the dataframe
-    code_list = [68, 69, 87, 135, 182, 270, 281]
+    # Aggregate french territories values to France
+    code_list = FRANCE_TERRITORY_CODES
     agg_country_code = 68
-    agg_country_name = faostat.country_groups.df
-    agg_country_name = agg_country_name[
-        agg_country_name.faost_code == agg_country_code
-    ].fao_table_name.values[0]
-    crop_data = aggregated_data(
-        crop_data, code_list, agg_country_code, agg_country_name
-    )
-    # Substitute faostat codes with iso3 codes
-    crop_data = reporter_iso_codes(crop_data)
+    agg_country_name = country_names()[agg_country_code]
     # Columns to be retained
     column_list = ["reporter_code", "product_code", "period", "value", "unit"]
-    # Harvested area data
     dropna_col = ["value"]
-    crop_data = replace_zero_with_nan_values(crop_data, dropna_col)
-    crop_data = crop_data.dropna(subset=dropna_col)
-    harvested_area = crop_data[crop_data["element"] == "area_harvested"][
-        column_list
-    ]
-    # Production data
-    production = crop_data[crop_data["element"].isin(["production", "stocks"])][
-        column_list
+    # Elements selected in the db for each output file (crop and wood production)
+    output_list = [
+        ("harvested_area_annual_variation.csv", ["area_harvested"], []),
+        (
+            "production_annual_variation.csv",
+            ["production", "stocks"],
+            ["production"],
+        ),
     ]
-    # Save csv files to env variable path or into biotrade data folder
-    save_file(harvested_area, "harvested_area_annual_variation.csv")
-    save_file(production, "production_annual_variation.csv")
+    for file_name, crop_elements, wood_elements in output_list:
+        # Select quantities from Faostat db for crop data for all countries (code < 1000)
+        # Zero values are not exported, drop them while reading the db by chunks
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future_list = [
+                executor.submit(
+                    cached_select_country_data,
+                    "crop_production",
+                    drop_zero_values=True,
+                    product_code=main_product_list,
+                    element=crop_elements,
+                )
+            ]
+            # Select wood production data, concurrently with the crop data
+            if wood_elements:
+                future_list.append(
+                    executor.submit(
+                        cached_select_country_data,
+                        "forestry_production",
+                        drop_zero_values=True,
+                        product_code=main_product_list,
+                        element=wood_elements,
+                    )
+                )
+        # Merge data
+        crop_data = pd.concat(
+            [future.result() for future in future_list], ignore_index=True
+        )
+        # Use narrower integer codes and years, values stay float64
+        crop_data = downcast_numeric_columns(crop_data)
+        # Add french territories aggregated values to the dataframe
+        crop_data = aggregated_data(
+            crop_data, code_list, agg_country_code, agg_country_name
+        )
+        # Substitute faostat codes with iso3 codes
+        crop_data = reporter_iso_codes(crop_data)
+        crop_data = drop_zero_nan_values(crop_data, dropna_col)
+        # Save csv files to env variable path or into biotrade data folder
+        save_file(crop_data[column_list], file_name)
 
 
 # Needed to avoid running module when imported
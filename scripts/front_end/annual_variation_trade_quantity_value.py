@@ -11,37 +11,35 @@ Script made to export data related to trade quantities of countries associated t
 
 def main():
     from scripts.front_end.functions import (
-        main_product_list,
-        comtrade_products,
-        merge_faostat_comtrade_data,
-        aggregated_data,
+        cached_regulation_trade_data,
         reporter_iso_codes,
-        replace_zero_with_nan_values,
-        save_file,
+        drop_zero_nan_values,
+        save_files_by_group,
+        save_dataset,
     )
-    from biotrade.faostat import faostat
     from biotrade.faostat.aggregate import agg_trade_eu_row
+    import numpy as np
+    import os
 
-    # Obtain faostat product codes
-    faostat_list = main_product_list(["crop_trade"])
-    # Obtain comtrade regulation codes
-    comtrade_regulation = comtrade_products()
-    # Trade data related to product code list
-    trade_data = merge_faostat_comtrade_data(
-        faostat_list, comtrade_regulation, aggregate=False
-    )
-    # Remove trade products where unit is heads
-    trade_data = trade_data[trade_data.unit != "Head"].reset_index(drop=True)
-    # Aggregate french territories values to France and add them to the dataframe
-    code_list = [68, 69, 87, 135, 182, 270, 281]
-    agg_country_code = 68
-    agg_country_name = faostat.country_groups.df
-    agg_country_name = agg_country_name[
-        agg_country_name.faost_code == agg_country_code
-    ].fao_table_name.values[0]
-    trade_data = aggregated_data(
-        trade_data, code_list, agg_country_code, agg_country_name
-    )
+    # Trade data of the regulation products, french territories aggregated to France
+    trade_data = cached_regulation_trade_data()
+    # Keep only the columns saved to the files, plus source, element and the country
+    # names needed by the EU and ROW aggregations. agg_trade_eu_row groups by all the
+    # remaining columns, so product, element_code, year and flag are dropped here
+    trade_data = trade_data[
+        [
+            "source",
+            "reporter_code",
+            "reporter",
+            "partner_code",
+            "partner",
+            "product_code",
+            "element",
+            "period",
+            "unit",
+            "value",
+        ]
+    ]
     # Substitute faostat codes with iso3 codes
     trade_data = reporter_iso_codes(trade_data)
     # Columns to be retained
@@ -53,49 +51,31 @@ def main():
         "value",
         "unit",
     ]
+    # File names by source and element, formatted with the suffix of EU and ROW files
+    file_names = {}
+    for source in ["faostat", "comtrade"]:
+        file_names.update(
+            {
+                (source, "import_quantity"): f"{source}_annual_variation{{}}.csv",
+                (source, "import_value"): f"{source}_value_annual_variation{{}}.csv",
+                (source, "export_quantity"): f"{source}_annual_variation{{}}_mf.csv",
+                (source, "export_value"): f"{source}_value_annual_variation{{}}_mf.csv",
+            }
+        )
     # Consider selected columns of import quantities and values and save the files (drop nan)
     dropna_col = ["value"]
-    trade_data = replace_zero_with_nan_values(trade_data, dropna_col)
-    trade_data = trade_data.dropna(subset=dropna_col)
-    df = trade_data[
-        (trade_data["source"] == "faostat")
-        & (trade_data["element"] == "import_quantity")
-    ][column_list]
-    save_file(df, "faostat_annual_variation.csv")
-    df = trade_data[
-        (trade_data["source"] == "faostat") & (trade_data["element"] == "import_value")
-    ][column_list]
-    save_file(df, "faostat_value_annual_variation.csv")
-    # Consider selected columns of export quantities and values and save the files (drop nan)
-    df = trade_data[
-        (trade_data["source"] == "faostat")
-        & (trade_data["element"] == "export_quantity")
-    ][column_list]
-    save_file(df, "faostat_annual_variation_mf.csv")
-    df = trade_data[
-        (trade_data["source"] == "faostat") & (trade_data["element"] == "export_value")
-    ][column_list]
-    save_file(df, "faostat_value_annual_variation_mf.csv")
-    # Consider selected columns of import quantities and values and save the files (drop nan)
-    df = trade_data[
-        (trade_data["source"] == "comtrade")
-        & (trade_data["element"] == "import_quantity")
-    ][column_list]
-    save_file(df, "comtrade_annual_variation.csv")
-    df = trade_data[
-        (trade_data["source"] == "comtrade") & (trade_data["element"] == "import_value")
-    ][column_list]
-    save_file(df, "comtrade_value_annual_variation.csv")
-    # Consider selected columns of export quantities and values and save the files (drop nan)
-    df = trade_data[
-        (trade_data["source"] == "comtrade")
-        & (trade_data["element"] == "export_quantity")
-    ][column_list]
-    save_file(df, "comtrade_annual_variation_mf.csv")
-    df = trade_data[
-        (trade_data["source"] == "comtrade") & (trade_data["element"] == "export_value")
-    ][column_list]
-    save_file(df, "comtrade_value_annual_variation_mf.csv")
+    trade_data = drop_zero_nan_values(trade_data, dropna_col)
+    # Save import (and export for mirror flows) quantities and values of each source
+    save_files_by_group(
+        trade_data,
+        {key: name.format("") for key, name in file_names.items()},
+        column_list,
+    )
+    # Optionally save the same data as a parquet dataset partitioned by source and element
+    if os.environ.get("FRONT_END_PARQUET"):
+        save_dataset(
+            trade_data[["source", "element", *column_list]], "annual_variation"
+        )
     # Aggregate to EU and ROW for reporters
     eu_row_data = agg_trade_eu_row(
         trade_data,
@@ -106,33 +86,19 @@ def main():
         ],
     )
     # Substitute with name and codes of the aggregations for the web platform
-    selector = eu_row_data["reporter"] == "eu"
-    eu_row_data.loc[selector, "reporter_code"] = "EU27"
-    eu_row_data.loc[~selector, "reporter_code"] = "ROW"
-    eu_row_data["reporter"].replace(
-        ["eu", "row"], ["European Union", "Rest Of the World"], inplace=True
-    )
+    selector = (eu_row_data["reporter"] == "eu").to_numpy()
+    eu_row_data["reporter_code"] = np.where(selector, "EU27", "ROW")
+    eu_row_data["reporter"] = np.where(selector, "European Union", "Rest Of the World")
     # Save imports
-    df = eu_row_data[
-        (eu_row_data["source"] == "faostat")
-        & (eu_row_data["element"] == "import_quantity")
-    ][column_list]
-    save_file(df, "faostat_annual_variation_eu_row.csv")
-    df = eu_row_data[
-        (eu_row_data["source"] == "faostat")
-        & (eu_row_data["element"] == "import_value")
-    ][column_list]
-    save_file(df, "faostat_value_annual_variation_eu_row.csv")
-    df = eu_row_data[
-        (eu_row_data["source"] == "comtrade")
-        & (eu_row_data["element"] == "import_quantity")
-    ][column_list]
-    save_file(df, "comtrade_annual_variation_eu_row.csv")
-    df = eu_row_data[
-        (eu_row_data["source"] == "comtrade")
-        & (eu_row_data["element"] == "import_value")
-    ][column_list]
-    save_file(df, "comtrade_value_annual_variation_eu_row.csv")
+    save_files_by_group(
+        eu_row_data,
+        {
+            key: name.format("_eu_row")
+            for key, name in file_names.items()
+            if key[1].startswith("import")
+        },
+        column_list,
+    )
     # Aggregate to EU and ROW for partners
     eu_row_data = agg_trade_eu_row(
         trade_data,
@@ -143,33 +109,19 @@ def main():
         ],
     )
     # Substitute with name and codes of the aggregations for the web platform
-    selector = eu_row_data["partner"] == "eu"
-    eu_row_data.loc[selector, "partner_code"] = "EU27"
-    eu_row_data.loc[~selector, "partner_code"] = "ROW"
-    eu_row_data["partner"].replace(
-        ["eu", "row"], ["European Union", "Rest Of the World"], inplace=True
-    )
+    selector = (eu_row_data["partner"] == "eu").to_numpy()
+    eu_row_data["partner_code"] = np.where(selector, "EU27", "ROW")
+    eu_row_data["partner"] = np.where(selector, "European Union", "Rest Of the World")
     # Save exports
-    df = eu_row_data[
-        (eu_row_data["source"] == "faostat")
-        & (eu_row_data["element"] == "export_quantity")
-    ][column_list]
-    save_file(df, "faostat_annual_variation_eu_row_mf.csv")
-    df = eu_row_data[
-        (eu_row_data["source"] == "faostat")
-        & (eu_row_data["element"] == "export_value")
-    ][column_list]
-    save_file(df, "faostat_value_annual_variation_eu_row_mf.csv")
-    df = eu_row_data[
-        (eu_row_data["source"] == "comtrade")
-        & (eu_row_data["element"] == "export_quantity")
-    ][column_list]
-    save_file(df, "comtrade_annual_variation_eu_row_mf.csv")
-    df = eu_row_data[
-        (eu_row_data["source"] == "comtrade")
-        & (eu_row_data["element"] == "export_value")
-    ][column_list]
-    save_file(df, "comtrade_value_annual_variation_eu_row_mf.csv")
+    save_files_by_group(
+        eu_row_data,
+        {
+            key: name.format("_eu_row")
+            for key, name in file_names.items()
+            if key[1].startswith("export")
+        },
+        column_list,
+    )
 
 
 # Needed to avoid running module when imported
@@ -11,52 +11,66 @@ Script made to export data of products and countries (averaging over periods of
 
 def main():
     # Import internal dependencies
+    from concurrent.futures import ThreadPoolExecutor
     import pandas as pd
     import numpy as np
-    from biotrade.faostat import faostat
     from scripts.front_end.functions import COLUMN_PERC_SUFFIX
     from scripts.front_end.functions import (
+        FRANCE_TERRITORY_CODES,
         aggregated_data,
+        country_names,
+        downcast_numeric_columns,
+        drop_zero_nan_values,
         main_product_list,
+        cached_select_country_data,
         average_results,
         reporter_iso_codes,
         replace_zero_with_nan_values,
-        save_file,
+        save_files,
     )
 
     # Obtain the main product codes
     main_product_list = main_product_list(
         ["crop_production", "forestry_production"]
     )
-    # Query db to obtain data
-    crop_df = faostat.db.select(
-        table="crop_production",
-        product_code=main_product_list,
-        element=["production", "area_harvested", "stocks"],
-    )
-    # Select wood production data
-    wood_df = faostat.db.select(
-        table="forestry_production",
-        product_code=main_product_list,
-        element=["production"],
-    )
-    # Merge data
+    # Query db to obtain data of reporters with code lower than 1000, and wood production
+    # data. The two queries are independent, run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        crop_future = executor.submit(
+            cached_select_country_data,
+            "crop_production",
+            product_code=main_product_list,
+            element=["production", "area_harvested", "stocks"],
+        )
+        wood_future = executor.submit(
+            cached_select_country_data,
+            "forestry_production",
+            product_code=main_product_list,
+            element=["production"],
+        )
+    crop_df, wood_df = crop_future.result(), wood_future.result()
+    # Merge data and encode the string key columns as categories
     df = pd.concat([crop_df, wood_df], ignore_index=True)
+    df = df.astype({"element": "category", "unit": "category"})
+    # Use narrower integer codes and years. Values stay float64, so that the averages and
+    # totals are not computed from rounded values
+    df = downcast_numeric_columns(
+        df, ["reporter_code", "product_code", "year", "period"]
+    )
     # Filter df with the common most recent year of the several element types
-    most_recent_year = df.groupby("element")["year"].max().min()
-    df = df[df.year <= most_recent_year]
-    # Select only reporter with code lower than 1000
-    df = df[df["reporter_code"] < 1000].reset_index(drop=True)
+    most_recent_year = (
+        df.groupby("element", sort=False, observed=True)["year"].max().min()
+    )
+    df = df[df.year <= most_recent_year].reset_index(drop=True)
     # Aggregate french territories values to France and add them to the dataframe
-    code_list = [68, 69, 87, 135, 182, 270, 281]
+    code_list = FRANCE_TERRITORY_CODES
     agg_country_code = 68
-    agg_country_name = faostat.country_groups.df
-    agg_country_name = agg_country_name[
-        agg_country_name.faost_code == agg_country_code
-    ].fao_table_name.values[0]
+    agg_country_name = country_names()[agg_country_code]
     df = aggregated_data(df, code_list, agg_country_code, agg_country_name)
     # Substitute faostat codes with iso3 codes
     df = reporter_iso_codes(df)
+    # Encode the iso3 codes as categories for the groupby aggregations of the averages
+    df["reporter_code"] = df["reporter_code"].astype("category")
     # Define the columns and codes for the average calculations
     dict_list = [
         {
@@ -87,24 +101,32 @@ def main():
         intervals,
     )
     # Columns to keep
-    drop_column = "element"
-    column_list = df_final.columns.tolist()
-    column_list.remove(drop_column)
+    column_list = df_final.columns.drop("element").tolist()
     # Define dropna columns
     dropna_col = [
         col for col in df_final.columns if col.endswith(COLUMN_PERC_SUFFIX)
     ]
-    df_final = replace_zero_with_nan_values(df_final, dropna_col)
-    df_final = df_final.dropna(subset=dropna_col, how="all")
+    # Drop rows without any value first, then replace the remaining zeros with nan
+    df_final = drop_zero_nan_values(df_final, dropna_col, how="all")
+    df_final = replace_zero_with_nan_values(df_final.copy(), dropna_col)
+    # Positions of the rows of each element, from a single groupby pass instead of
+    # filtering df_final for each file
+    element_rows = df_final.groupby("element", sort=False, observed=True).indices
+    file_elements = {
+        "harvested_area_average.csv": ["area_harvested"],
+        "production_average.csv": ["production", "stocks"],
+    }
+    file_list = []
+    for file_name, element_list in file_elements.items():
+        # Sorted positions, to keep the row order of df_final
+        rows = np.sort(
+            np.concatenate(
+                [element_rows.get(element, []) for element in element_list]
+            ).astype(int)
+        )
+        file_list.append((df_final.iloc[rows][column_list], file_name))
     # Save csv files to env variable path or into biotrade data folder
-    harvested_area = df_final[df_final["element"] == "area_harvested"][
-        column_list
-    ]
-    save_file(harvested_area, "harvested_area_average.csv")
-    production = df_final[df_final["element"].isin(["production", "stocks"])][
-        column_list
-    ]
-    save_file(production, "production_average.csv")
+    save_files(file_list)
 
 
 # Needed to avoid running module when imported
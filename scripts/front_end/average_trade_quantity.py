@@ -11,43 +11,22 @@ Script used to compute averages and percentages of trade quantities related to t
 
 def main():
     from scripts.front_end.functions import (
-        main_product_list,
-        comtrade_products,
-        merge_faostat_comtrade_data,
-        aggregated_data,
+        cached_regulation_trade_data,
         reporter_iso_codes,
         average_results,
-        replace_zero_with_nan_values,
-        save_file,
+        concat_non_empty,
+        drop_zero_nan_values,
+        save_files,
     )
     from scripts.front_end.functions import (
         COLUMN_PERC_SUFFIX,
         COLUMN_AVG_SUFFIX,
     )
-    from biotrade.faostat import faostat
     from biotrade.faostat.aggregate import agg_trade_eu_row
-    import pandas as pd
+    from concurrent.futures import ThreadPoolExecutor
 
-    # Obtain faostat product codes
-    faostat_list = main_product_list(["crop_trade"])
-    # Obtain comtrade regulation codes
-    comtrade_regulation = comtrade_products()
-    # Trade data related to product code list
-    trade_data = merge_faostat_comtrade_data(
-        faostat_list, comtrade_regulation, aggregate=False
-    )
-    # Remove trade products where units is head
-    trade_data = trade_data[trade_data.unit != "Head"].reset_index(drop=True)
-    # Aggregate french territories values to France and add them to the dataframe
-    code_list = [68, 69, 87, 135, 182, 270, 281]
-    agg_country_code = 68
-    agg_country_name = faostat.country_groups.df
-    agg_country_name = agg_country_name[
-        agg_country_name.faost_code == agg_country_code
-    ].fao_table_name.values[0]
-    trade_data = aggregated_data(
-        trade_data, code_list, agg_country_code, agg_country_name
-    )
+    # Trade data of the regulation products, french territories aggregated to France
+    trade_data = cached_regulation_trade_data()
     # Substitute faostat codes with iso3 codes
     trade_data = reporter_iso_codes(trade_data)
     # Define the columns and codes for the average calculations
@@ -65,188 +44,119 @@ def main():
             "index_list_add": ["partner_code"],
         },
     ]
-    # Consider faostat data
-    df_faostat = trade_data[trade_data["source"] == "faostat"]
-    # Calculate the averages and percentages
-    df_faostat = average_results(
-        df_faostat,
-        100,
-        dict_list,
-    )
-    # Consider comtrade data (excluded estimated values)
-    df_comtrade = trade_data[trade_data["source"] == "comtrade"]
-    # Calculate the averages and percentages
-    df_comtrade = average_results(
-        df_comtrade,
-        100,
-        dict_list,
-    )
-    drop_column_list = [
-        "element",
-        dict_list[1]["percentage_col"] + COLUMN_PERC_SUFFIX,
-    ]
-    column_list = df_faostat.columns.tolist()
-    for drop_column in drop_column_list:
-        column_list.remove(drop_column)
-    # Define dropna columns
-    dropna_col = [
-        col
-        for col in column_list
-        if col.endswith((COLUMN_AVG_SUFFIX, COLUMN_PERC_SUFFIX))
-    ]
-    # Consider selected columns of import quantities and save the file (drop nan)
-    df_faostat_avg_imp = df_faostat.copy()
-    df_faostat_avg_imp = replace_zero_with_nan_values(df_faostat_avg_imp, dropna_col)
-    df_faostat_avg_imp = df_faostat_avg_imp.dropna(subset=dropna_col)
-    df_faostat_reporter = df_faostat_avg_imp[
-        df_faostat_avg_imp["element"] == "import_quantity"
-    ][column_list]
-    save_file(df_faostat_reporter, "faostat_average.csv")
-    # Consider selected columns of import quantities and save the file (drop nan)
-    df_comtrade_avg_imp = df_comtrade.copy()
-    df_comtrade_avg_imp = replace_zero_with_nan_values(df_comtrade_avg_imp, dropna_col)
-    df_comtrade_avg_imp = df_comtrade_avg_imp.dropna(subset=dropna_col)
-    df_comtrade_reporter = df_comtrade_avg_imp[
-        df_comtrade_avg_imp["element"] == "import_quantity"
-    ][column_list]
-    save_file(df_comtrade_reporter, "comtrade_average.csv")
-    drop_column_list = [
-        "element",
-        dict_list[0]["percentage_col"] + COLUMN_PERC_SUFFIX,
+    # Element, percentage column to drop, code column and file suffix of each flow
+    # (import quantities by reporter and export quantities for the mirror flows)
+    flow_list = [
+        ("import_quantity", dict_list[1]["percentage_col"], "reporter_code", ""),
+        ("export_quantity", dict_list[0]["percentage_col"], "partner_code", "_mf"),
     ]
-    column_list = df_faostat.columns.tolist()
-    for drop_column in drop_column_list:
-        column_list.remove(drop_column)
-    # Define dropna columns
-    dropna_col = [
-        col
-        for col in column_list
-        if col.endswith((COLUMN_AVG_SUFFIX, COLUMN_PERC_SUFFIX))
-    ]
-    # Consider selected columns of export quantities and save the file (drop nan) --> mirror flows
-    df_faostat_avg_exp = df_faostat.copy()
-    df_faostat_avg_exp = replace_zero_with_nan_values(df_faostat_avg_exp, dropna_col)
-    df_faostat_avg_exp = df_faostat_avg_exp.dropna(subset=dropna_col)
-    df_faostat_partner = df_faostat_avg_exp[
-        df_faostat_avg_exp["element"] == "export_quantity"
-    ][column_list]
-    save_file(df_faostat_partner, "faostat_average_mf.csv")
-    # Consider selected columns of export quantities and save the file (drop nan) --> mirror flows
-    df_comtrade_avg_exp = df_comtrade.copy()
-    df_comtrade_avg_exp = replace_zero_with_nan_values(df_comtrade_avg_exp, dropna_col)
-    df_comtrade_avg_exp = df_comtrade_avg_exp.dropna(subset=dropna_col)
-    df_comtrade_partner = df_comtrade_avg_exp[
-        df_comtrade_avg_exp["element"] == "export_quantity"
-    ][column_list]
-    save_file(df_comtrade_partner, "comtrade_average_mf.csv")
-    # Consider averages for EU and rest of the world partners
-    # Aggregate data with reporters as eu and row
-    df_group_reporter = agg_trade_eu_row(
-        trade_data,
-        grouping_side="reporter",
-        drop_index_col=["flag"],
-    )
-    # Aggregate data with partners as eu and row
-    df_group_partner = agg_trade_eu_row(
-        trade_data,
-        grouping_side="partner",
-        drop_index_col=["flag"],
-    )
-    # Concatenate in a unique df
-    df_group = pd.concat(
-        [df_group_reporter, df_group_partner],
-        ignore_index=True,
-    )
-    # Substitute with name and codes of the aggregations for the web platform
-    selector = df_group["reporter"] == "eu"
-    df_group.loc[selector, "reporter_code"] = "EU27"
-    selector = df_group["reporter"] == "row"
-    df_group.loc[selector, "reporter_code"] = "ROW"
-    selector = df_group["partner"] == "eu"
-    df_group.loc[selector, "partner_code"] = "EU27"
-    selector = df_group["partner"] == "row"
-    df_group.loc[selector, "partner_code"] = "ROW"
-    df_group[["reporter", "partner"]] = df_group[["reporter", "partner"]].replace(
-        ["eu", "row"], ["European Union", "Rest Of the World"]
-    )
-    # Consider faostat data
-    df_faostat = df_group[df_group["source"] == "faostat"]
-    # Calculate the averages and percentages
-    df_faostat = average_results(
-        df_faostat,
-        100,
-        dict_list,
-    )
-    # Consider comtrade data (excluded estimated values)
-    df_comtrade = df_group[df_group["source"] == "comtrade"]
-    # Calculate the averages and percentages
-    df_comtrade = average_results(
-        df_comtrade,
-        100,
-        dict_list,
-    )
-    drop_column_list = [
-        "element",
-        dict_list[1]["percentage_col"] + COLUMN_PERC_SUFFIX,
-    ]
-    column_list = df_faostat.columns.tolist()
-    for drop_column in drop_column_list:
-        column_list.remove(drop_column)
-    # Define dropna columns
-    dropna_col = [
-        col
-        for col in column_list
-        if col.endswith((COLUMN_AVG_SUFFIX, COLUMN_PERC_SUFFIX))
-    ]
-    # Consider selected columns of import quantities and save the file (drop nan)
-    df_faostat_avg_imp = df_faostat.copy()
-    df_faostat_avg_imp = replace_zero_with_nan_values(df_faostat_avg_imp, dropna_col)
-    df_faostat_avg_imp = df_faostat_avg_imp.dropna(subset=dropna_col)
-    df_faostat_reporter = df_faostat_avg_imp[
-        (df_faostat_avg_imp["element"] == "import_quantity")
-        & (df_faostat_avg_imp["reporter_code"].isin(["EU27", "ROW"]))
-    ][column_list]
-    save_file(df_faostat_reporter, "faostat_average_eu_row.csv")
-    # Consider selected columns of import quantities and save the file (drop nan)
-    df_comtrade_avg_imp = df_comtrade.copy()
-    df_comtrade_avg_imp = replace_zero_with_nan_values(df_comtrade_avg_imp, dropna_col)
-    df_comtrade_avg_imp = df_comtrade_avg_imp.dropna(subset=dropna_col)
-    df_comtrade_reporter = df_comtrade_avg_imp[
-        (df_comtrade_avg_imp["element"] == "import_quantity")
-        & (df_comtrade_avg_imp["reporter_code"].isin(["EU27", "ROW"]))
-    ][column_list]
-    save_file(df_comtrade_reporter, "comtrade_average_eu_row.csv")
-    drop_column_list = [
-        "element",
-        dict_list[0]["percentage_col"] + COLUMN_PERC_SUFFIX,
-    ]
-    column_list = df_faostat.columns.tolist()
-    for drop_column in drop_column_list:
-        column_list.remove(drop_column)
-    # Define dropna columns
-    dropna_col = [
-        col
-        for col in column_list
-        if col.endswith((COLUMN_AVG_SUFFIX, COLUMN_PERC_SUFFIX))
-    ]
-    # Consider selected columns of export quantities and save the file (drop nan) --> mirror flows
-    df_faostat_avg_exp = df_faostat.copy()
-    df_faostat_avg_exp = replace_zero_with_nan_values(df_faostat_avg_exp, dropna_col)
-    df_faostat_avg_exp = df_faostat_avg_exp.dropna(subset=dropna_col)
-    df_faostat_partner = df_faostat_avg_exp[
-        (df_faostat_avg_exp["element"] == "export_quantity")
-        & (df_faostat_avg_exp["partner_code"].isin(["EU27", "ROW"]))
-    ][column_list]
-    save_file(df_faostat_partner, "faostat_average_eu_row_mf.csv")
-    # Consider selected columns of export quantities and save the file (drop nan) --> mirror flows
-    df_comtrade_avg_exp = df_comtrade.copy()
-    df_comtrade_avg_exp = replace_zero_with_nan_values(df_comtrade_avg_exp, dropna_col)
-    df_comtrade_avg_exp = df_comtrade_avg_exp.dropna(subset=dropna_col)
-    df_comtrade_partner = df_comtrade_avg_exp[
-        (df_comtrade_avg_exp["element"] == "export_quantity")
-        & (df_comtrade_avg_exp["partner_code"].isin(["EU27", "ROW"]))
-    ][column_list]
-    save_file(df_comtrade_partner, "comtrade_average_eu_row_mf.csv")
+
+    def source_average_files(source, df_source, file_name, eu_row=False):
+        """
+        Calculate the averages and percentages of a source, then select the columns of
+        each flow to be saved (drop zero and nan values)
+
+        :param source (str), name of the source
+        :param df_source (DataFrame), trade data of the source
+        :param file_name (str), name of the files before the flow suffix
+        :param eu_row (Boolean), if True save only the rows where the flow side is EU27 or ROW
+        :return file_list (list), tuples of the data frame and the name of the file of each flow
+
+        """
+        # Encode the iso3 codes as categories for the groupby aggregations of the averages
+        df_source = df_source.astype(
+            {"reporter_code": "category", "partner_code": "category"}
+        )
+        df_source = average_results(df_source, 100, dict_list)
+        file_list = []
+        # Positions of the rows of each element, from a single groupby pass instead of
+        # comparing the element column for each flow
+        element_rows = df_source.groupby("element", sort=False, observed=True).indices
+        for element, percentage_col, code_col, file_suffix in flow_list:
+            column_list = df_source.columns.drop(
+                ["element", percentage_col + COLUMN_PERC_SUFFIX]
+            ).tolist()
+            dropna_col = [
+                col
+                for col in column_list
+                if col.endswith((COLUMN_AVG_SUFFIX, COLUMN_PERC_SUFFIX))
+            ]
+            # Rows of the flow (sorted positions, in the order of df_source) and saved
+            # columns taken at once
+            df = df_source.iloc[
+                element_rows.get(element, []),
+                df_source.columns.get_indexer(column_list),
+            ]
+            if eu_row:
+                df = df[df[code_col].isin(["EU27", "ROW"]).to_numpy()]
+            df = drop_zero_nan_values(df, dropna_col)
+            file_list.append((df, f"{source}_{file_name}{file_suffix}.csv"))
+        return file_list
+
+    # The outputs of each source are independent, compute them in a pool of threads
+    # (pandas releases the GIL in its groupby and merge kernels). average_results computes
+    # its dicts sequentially in each thread. The files are saved by the main thread
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(source_average_files, source, df_source, "average")
+            for source, df_source in trade_data.groupby(
+                "source", sort=False, observed=True
+            )
+        ]
+        # Consider averages for EU and rest of the world partners, while the averages
+        # of the countries are computed
+        # Keep once for both aggregations only the columns used by the averages and the
+        # country names, so that agg_trade_eu_row copies and groups fewer columns
+        eu_row_data = trade_data[
+            [
+                "source",
+                "reporter_code",
+                "reporter",
+                "partner_code",
+                "partner",
+                "product_code",
+                "element",
+                "year",
+                "unit",
+                "value",
+            ]
+        ]
+        # Aggregate data with reporters as eu and row
+        df_group_reporter = agg_trade_eu_row(
+            eu_row_data,
+            grouping_side="reporter",
+            drop_index_col=["flag"],
+        )
+        # Aggregate data with partners as eu and row
+        df_group_partner = agg_trade_eu_row(
+            eu_row_data,
+            grouping_side="partner",
+            drop_index_col=["flag"],
+        )
+        # Concatenate in a unique df, skipping an empty side
+        df_group = concat_non_empty([df_group_reporter, df_group_partner])
+        # Substitute with name and codes of the aggregations for the web platform
+        code_map = {"eu": "EU27", "row": "ROW"}
+        name_map = {"eu": "European Union", "row": "Rest Of the World"}
+        for side in ["reporter", "partner"]:
+            df_group[f"{side}_code"] = (
+                df_group[side].map(code_map).fillna(df_group[f"{side}_code"])
+            )
+            df_group[side] = df_group[side].map(name_map).fillna(df_group[side])
+        # Same calculations for the EU and ROW aggregations, saving only the rows where
+        # the flow side is EU27 or ROW
+        futures += [
+            executor.submit(
+                source_average_files, source, df_source, "average_eu_row", eu_row=True
+            )
+            for source, df_source in df_group.groupby(
+                "source", sort=False, observed=True
+            )
+        ]
+        # Save the files of each source as soon as they are computed, this also raises
+        # possible errors of the threads
+        for future in futures:
+            save_files(future.result())
 
 
 # Needed to avoid running module when imported
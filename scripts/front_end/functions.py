@@ -9,10 +9,19 @@ Script which contains functions used to produce data for the Web Platform
 """
 
 import os
+import time
+import hashlib
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from pandas.api.types import is_integer_dtype
+from sqlalchemy import func, select
 from biotrade.faostat import faostat
+from biotrade.faostat.country_groups import COUNTRY_CODE_MAX
+from biotrade.comtrade import comtrade
 from biotrade import data_dir
 from biotrade.common.compare import merge_faostat_comtrade
 from biotrade.common.time_series import (
@@ -25,6 +34,17 @@ from biotrade.common.time_series import (
 COLUMN_AVG_SUFFIX = "_avg_value"
 COLUMN_PERC_SUFFIX = "_percentage"
 COLUMN_TOT_SUFFIX = "_tot_value"
+# Faostat codes of France and of its territories, aggregated to France (code 68)
+FRANCE_TERRITORY_CODES = frozenset({68, 69, 87, 135, 182, 270, 281})
+# Narrower integer types of the db code and year columns. Values stay float64, so that the
+# averages, totals and changes exported to the web platform keep their precision
+NUMERIC_DTYPES = {
+    "reporter_code": "int32",
+    "partner_code": "int32",
+    "product_code": "int32",
+    "year": "int16",
+    "period": "int16",
+}
 
 
 def replace_zero_with_nan_values(df, column_list):
@@ -40,6 +60,48 @@ def replace_zero_with_nan_values(df, column_list):
     return df
 
 
+def drop_zero_nan_values(df, column_list, how="any"):
+    """
+    Drop rows with zero or nan values in the columns, with a single mask instead of
+    replace_zero_with_nan_values followed by dropna
+
+    :param df (DataFrame), output to be saved
+    :param column_list (list), name of columns where zero and nan values are dropped
+    :param how (str), "any" drops rows with a zero or nan value in any of the columns (default),
+        "all" drops rows with zero or nan values in all the columns
+    :return df (DataFrame), without zero and nan values
+
+    """
+    values = df[column_list].to_numpy()
+    # Float values are checked directly by numpy, other types (object) by pandas
+    notna = ~np.isnan(values) if values.dtype.kind == "f" else pd.notna(values)
+    valid = (values != 0) & notna
+    mask = valid.all(axis=1) if how == "any" else valid.any(axis=1)
+    return df[mask]
+
+
+def downcast_numeric_columns(df, column_list=None):
+    """
+    Convert code and year columns to the narrower types of NUMERIC_DTYPES to reduce memory use
+
+    :param df (DataFrame), data loaded from the db
+    :param column_list (list), columns to be converted. Default is None and all the NUMERIC_DTYPES columns are converted
+    :return df (DataFrame), with converted columns
+
+    """
+    if column_list is None:
+        column_list = NUMERIC_DTYPES.keys()
+    dtypes = {}
+    for col in column_list:
+        if col not in df.columns:
+            continue
+        # Codes can be strings (iso3 or comtrade codes) or contain nan, leave them as they are
+        if not is_integer_dtype(df[col]):
+            continue
+        dtypes[col] = NUMERIC_DTYPES[col]
+    return df.astype(dtypes)
+
+
 def save_file(df, file_name):
     """
     Function which save output scripts
@@ -48,14 +110,164 @@ def save_file(df, file_name):
     :param file_name (str), name of the output file
 
     """
-    # Save csv files to env variable path or into biotrade data folder alternatively
+    path = _write_file(df, file_name)
+    print(f"Saved file {file_name} to {path}")
+
+
+def _write_file(df, file_name):
+    """
+    Write the output file without reporting it, so that it can run in a pool of threads
+    and the main thread reports the saved files in order
+
+    :param df (DataFrame), output to be saved
+    :param file_name (str), name of the output file
+    :return path (Path), folder of the saved file
+
+    """
+    path = front_end_data_dir()
+    df.to_csv(path / file_name, index=False, na_rep="null")
+    return path
+
+
+def front_end_data_dir():
+    """
+    Folder of the output files, FRONT_END_DATA env variable path or biotrade data folder alternatively
+
+    :return path (Path), folder of the output files
+
+    """
     if os.environ.get("FRONT_END_DATA"):
         path = Path(os.environ["FRONT_END_DATA"])
     else:
         path = data_dir / "front_end"
     path.mkdir(exist_ok=True)
-    df.to_csv(path / file_name, index=False, na_rep="null")
-    print(f"Saved file {file_name} to {path}")
+    return path
+
+
+def save_dataset(df, dataset_name, partition_cols=("source", "element")):
+    """
+    Save df as a parquet dataset partitioned by the given columns (one folder for each value),
+    so that consumers can read only the partitions they need. Requires the optional pyarrow
+    dependency, installed with pip install biotrade[parquet]
+
+    :param df (DataFrame), output to be saved
+    :param dataset_name (str), name of the dataset folder
+    :param partition_cols (tuple), columns defining the partitions. Default is source and element
+
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as error:
+        raise ImportError(
+            "Saving parquet datasets requires pyarrow, "
+            "install it with: python -m pip install biotrade[parquet]"
+        ) from error
+    partition_cols = list(partition_cols)
+    path = front_end_data_dir() / dataset_name
+    # Partition values as strings, otherwise categorical columns create empty partitions
+    df = df.astype({col: str for col in partition_cols})
+    df.to_parquet(path, index=False, partition_cols=partition_cols)
+    print(f"Saved dataset {dataset_name} to {path.parent}")
+
+
+def save_files(file_list, max_workers=4):
+    """
+    Save several independent output files concurrently with a pool of threads
+
+    :param file_list (list), tuples of the data frame and the name of the file to be saved
+    :param max_workers (int), number of threads writing the files
+
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_write_file, df, file_name) for df, file_name in file_list
+        ]
+        # Raise possible errors of the writing threads. The saved files are reported by
+        # the main thread, so that the messages are not interleaved
+        for future, (_, file_name) in zip(futures, file_list):
+            print(f"Saved file {file_name} to {future.result()}")
+
+
+def save_files_by_group(
+    df, file_names, column_list, groupby_cols=["source", "element"], max_workers=4
+):
+    """
+    Save a file for each group of df in a single pass over the data, instead of filtering df for each file.
+    The files are independent and written concurrently by a pool of threads. Every file of file_names is
+    saved, with only the header when its group is not in df
+
+    :param df (DataFrame), output to be split and saved
+    :param file_names (dict), file name of each group key, groups not in the dictionary are not saved
+    :param column_list (list), columns to be saved
+    :param groupby_cols (list), columns defining the groups. Default is source and element
+    :param max_workers (int), number of threads writing the files
+
+    """
+    # Resolve the positions of the columns to be saved once for all the groups
+    column_index = df.columns.get_indexer(column_list)
+    if (column_index == -1).any():
+        missing = [col for col, index in zip(column_list, column_index) if index == -1]
+        raise KeyError(f"Columns {missing} are not in the data frame")
+    df_groups = dict(tuple(df.groupby(groupby_cols, sort=False, observed=True)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # The column selection is done by the threads as well, the main thread only splits df
+        futures = [
+            executor.submit(
+                lambda df_group, file_name: _write_file(
+                    df_group.iloc[:, column_index], file_name
+                ),
+                # Empty data frame with the same columns for the missing groups
+                df_groups.get(key, df.iloc[:0]),
+                file_name,
+            )
+            for key, file_name in file_names.items()
+        ]
+        # Raise possible errors of the writing threads. The saved files are reported by
+        # the main thread, so that the messages are not interleaved
+        for future, file_name in zip(futures, file_names.values()):
+            print(f"Saved file {file_name} to {future.result()}")
+
+
+def concat_non_empty(df_list):
+    """
+    Concatenate data frames with a new index, skipping the empty ones. When a single data frame
+    is not empty it is returned with a new index instead of being copied by the concatenation
+
+    :param df_list (list), data frames to be concatenated
+    :return df (DataFrame), concatenated data frame
+
+    """
+    non_empty_list = [df for df in df_list if not df.empty]
+    if len(non_empty_list) == 1:
+        # Same columns, in the same order, as the concatenation
+        columns = df_list[0].columns.append([df.columns for df in df_list[1:]]).unique()
+        df = non_empty_list[0].reindex(columns=columns, copy=False)
+        return df.set_axis(pd.RangeIndex(len(df)), copy=False)
+    # All empty data frames are concatenated to keep their columns
+    return pd.concat(non_empty_list or df_list, ignore_index=True)
+
+
+def select_country_data(table, drop_zero_values=False, chunksize=10**6, **kwargs):
+    """
+    Select Faostat data chunk by chunk, keeping only the country reporters (code < 1000)
+
+    :param table (str), name of the Faostat table to select from
+    :param drop_zero_values (Boolean), if True rows with zero values are also dropped. Default is False
+    :param chunksize (int), number of rows read from the db at a time
+    :param kwargs, other arguments passed to faostat.db.select
+    :return df (DataFrame), filtered data
+
+    """
+    chunk_list = []
+    # Country groups (code > COUNTRY_CODE_MAX) are filtered by the database
+    for chunk in faostat.db.select(
+        table=table, reporter_code_max=COUNTRY_CODE_MAX, chunksize=chunksize, **kwargs
+    ):
+        if drop_zero_values:
+            chunk = chunk[chunk["value"] != 0]
+        chunk_list.append(chunk)
+    df = pd.concat(chunk_list, ignore_index=True)
+    return df
 
 
 def comtrade_products():
@@ -96,11 +308,25 @@ def comtrade_products():
 def main_product_list(table_list):
     """
     Return the main list of Faostat products (without duplicates) contained into the file biotade/config_data/faostat_products_name_code_shortname.csv
-    depending on the purpose: production or trade
+    depending on the purpose: production or trade.
+    The list is computed once per process for a given table list.
 
     :parameter table_list (list), list of the tables to retrieve product codes
     :return product_list (list), list of the main Faostat product codes
 
+    """
+    # Return a new list at each call so that callers cannot modify the cached codes
+    return list(_main_product_codes(tuple(table_list)))
+
+
+@lru_cache(maxsize=None)
+def _main_product_codes(table_tuple):
+    """
+    Cached computation of main_product_list, with the table list as a tuple to be hashable
+
+    :parameter table_tuple (tuple), tables to retrieve product codes
+    :return product_list (tuple), main Faostat product codes
+
     """
     # Name of product file to retrieve
     main_product_file = (
@@ -114,11 +340,11 @@ def main_product_list(table_list):
         .code.drop_duplicates()
         .to_list()
     )
-    # Define db and pre allocate dataframe
+    # Define db
     db = faostat.db
-    df = pd.DataFrame(columns=["product_code"])
     # Define which products are inside the production/trade list
-    for table in table_list:
+    product_list = []
+    for table in table_tuple:
         table = db.tables[table]
         df_table = pd.read_sql_query(
             table.select()
@@ -126,44 +352,49 @@ def main_product_list(table_list):
             .with_only_columns([table.c.product_code]),
             db.engine,
         )
-        df = pd.concat([df, df_table], ignore_index=True)
-    # Drop db product duplicates
-    product_list = df.product_code.drop_duplicates().to_list()
+        product_list += df_table.product_code.to_list()
     # Obtain the intersection
-    product_list = list(set(main_products).intersection(product_list))
+    product_list = tuple(set(main_products).intersection(product_list))
     return product_list
 
 
-def reporter_iso_codes(df):
+@lru_cache(maxsize=1)
+def country_groups():
     """
-    Script which transforms faostat reporter and partner codes into iso3 codes
+    Return the Faostat country groups table, read once per process.
+    The cached data frame is shared between callers and must not be modified in place
 
-    :param df (DataFrame), which contains reporter_code and (if applicable) partner_code columns
-    :return df (DataFrame), with the substitution into iso3 codes
+    :return df (DataFrame), faostat.country_groups.df
 
     """
-    # Reporter codes
-    reporter_file = faostat.config_data_dir / "faostat_country_groups.csv"
-    reporter = pd.read_csv(reporter_file)
-    # Obtain iso3 codes for reporters and partners
-    df = df.merge(
-        reporter[["faost_code", "iso3_code"]],
-        how="left",
-        left_on="reporter_code",
-        right_on="faost_code",
-    )
-    df["reporter_code"] = df["iso3_code"]
-    if "partner_code" in df.columns:
-        df.drop(columns=["faost_code", "iso3_code"], inplace=True)
-        df = df.merge(
-            reporter[["faost_code", "iso3_code"]],
-            how="left",
-            left_on=["partner_code"],
-            right_on=["faost_code"],
-        )
-        df["partner_code"] = df["iso3_code"]
-    df.drop(columns=["faost_code", "iso3_code"], inplace=True)
-    # Consider only data of official country codes by GISCO
+    return faostat.country_groups.df
+
+
+@lru_cache(maxsize=1)
+def country_names():
+    """
+    Return a dictionary of the Faostat country names by faostat code, built once per process
+
+    :return country_names (dict), fao_table_name values with faost_code keys
+
+    """
+    df = country_groups()
+    return dict(zip(df["faost_code"].to_numpy(), df["fao_table_name"].to_numpy()))
+
+
+@lru_cache(maxsize=1)
+def iso3_codes_lookup():
+    """
+    Return arrays of the iso3 codes and of their GISCO validity indexed by faostat code,
+    built once per process
+
+    :return iso3_codes (array), object array of iso3 codes (nan if missing) with faostat code positions
+    :return is_gisco (array), boolean array, True for the official country codes by GISCO
+    :return is_gisco_missing (bool), validity of the codes without iso3 code or out of the arrays
+
+    """
+    reporter = country_groups()
+    # Official country codes by GISCO
     country_codes = (
         pd.read_csv(
             data_dir / "GISCO_CNTR_LIST.txt",
@@ -172,12 +403,51 @@ def reporter_iso_codes(df):
         .ISO3_CODE.drop_duplicates()
         .to_list()
     )
-    df = df[df.reporter_code.isin(country_codes)].reset_index(drop=True)
+    # Dictionary of iso3 codes, the duplicated faostat codes (-1) have no iso3 code
+    iso3_codes = dict(zip(reporter["faost_code"].values, reporter["iso3_code"].values))
+    iso3_codes = {code: iso3 for code, iso3 in iso3_codes.items() if code >= 0}
+    lookup = np.full(reporter["faost_code"].max() + 1, np.nan, dtype=object)
+    lookup[list(iso3_codes.keys())] = list(iso3_codes.values())
+    is_gisco = pd.Series(lookup).isin(country_codes).to_numpy()
+    is_gisco_missing = bool(pd.Series([np.nan]).isin(country_codes).iloc[0])
+    return lookup, is_gisco, is_gisco_missing
+
+
+def reporter_iso_codes(df):
+    """
+    Script which transforms faostat reporter and partner codes into iso3 codes
+
+    :param df (DataFrame), which contains reporter_code and (if applicable) partner_code columns
+    :return df (DataFrame), with the substitution into iso3 codes
+
+    """
+    lookup, is_gisco, is_gisco_missing = iso3_codes_lookup()
+    code_cols = [col for col in ["reporter_code", "partner_code"] if col in df.columns]
+    iso3_codes = {}
+    # Consider only data of official country codes by GISCO
+    selector = np.ones(len(df), dtype=bool)
+    for col in code_cols:
+        if is_integer_dtype(df[col]):
+            # Gather the iso3 codes by position, codes out of the lookup range have none
+            codes = df[col].to_numpy()
+            in_range = (codes >= 0) & (codes < len(lookup))
+            iso3_codes[col] = np.full(len(codes), np.nan, dtype=object)
+            iso3_codes[col][in_range] = lookup[codes[in_range]]
+            col_selector = np.full(len(codes), is_gisco_missing)
+            col_selector[in_range] = is_gisco[codes[in_range]]
+        else:
+            iso3_codes[col] = df[col].map(dict(enumerate(lookup))).to_numpy()
+            col_selector = df[col].map(dict(enumerate(is_gisco))).to_numpy()
+            col_selector = np.where(
+                pd.isna(col_selector), is_gisco_missing, col_selector
+            ).astype(bool)
+        selector &= col_selector
     if "partner_code" in df.columns:
-        df = df[df.partner_code.isin(country_codes)].reset_index(drop=True)
         # Remove free zones internal trade data
-        df = df[df["reporter_code"] != df["partner_code"]].reset_index(drop=True)
-    return df
+        selector &= iso3_codes["reporter_code"] != iso3_codes["partner_code"]
+    # Obtain iso3 codes for reporters and partners (assign returns a new data frame)
+    df = df.assign(**{col: iso3_codes[col] for col in code_cols})
+    return df[selector].reset_index(drop=True)
 
 
 def merge_faostat_comtrade_data(
@@ -198,8 +468,9 @@ def merge_faostat_comtrade_data(
     :return df_merge (DataFrame), dataframe with merged data
 
     """
-    # Pre allocate dataframe
-    df_merge = pd.DataFrame()
+    # Merged data of each chunk of products, concatenated once at the end instead of
+    # copying the growing data frame at each chunk
+    chunk_list = []
     # Select quantities from Faostat db and Comtrade for trade data for all countries (code < 1000)
     if comtrade_regulation is not None:
         regulation_products = comtrade_regulation.product_code.unique().tolist()
@@ -234,19 +505,19 @@ def merge_faostat_comtrade_data(
             comtrade_code,
             aggregate,
         )
-        # Select only import and export (exclude re-import and re-export for now) and remove nan reporters/partners (=-1)
+        # Select only import and export (exclude re-import and re-export for now) and remove nan reporters/partners (=-1).
+        # The conditions are combined as numpy arrays, without an intermediate two-column frame
         df = df[
-            (
-                df.element.isin(
-                    [
-                        "import_value",
-                        "import_quantity",
-                        "export_value",
-                        "export_quantity",
-                    ]
-                )
-            )
-            & (~(df[["reporter_code", "partner_code"]] == -1).any(axis=1))
+            df.element.isin(
+                [
+                    "import_value",
+                    "import_quantity",
+                    "export_value",
+                    "export_quantity",
+                ]
+            ).to_numpy()
+            & (df["reporter_code"].to_numpy() != -1)
+            & (df["partner_code"].to_numpy() != -1)
         ].reset_index(drop=True)
         if comtrade_regulation is not None:
             # Merge to obtain regulation product codes
@@ -263,16 +534,325 @@ def merge_faostat_comtrade_data(
             df.loc[selector, "product_code"] = df.loc[
                 selector, "product_code_regulation"
             ]
-            df = df.groupby(index_list)["value"].agg(sum).reset_index()
-        df_merge = pd.concat([df_merge, df], ignore_index=True)
+            # Sum with as_index=False and sort=False, the order of the rows does not
+            # matter since the chunks are concatenated afterwards
+            df = df.groupby(index_list, sort=False, as_index=False)["value"].sum()
+        chunk_list.append(df)
         # Avoid to retrieve for all the cycle the same faostat data
         if i == 0:
             faostat_code = None
+    df_merge = concat_non_empty(chunk_list)
     # Use period instead of year column
     df_merge["period"] = df_merge["year"]
     return df_merge
 
 
+def cached_merge_faostat_comtrade_data(
+    faostat_code=None,
+    comtrade_regulation=None,
+    aggregate=True,
+):
+    """
+    Return merge_faostat_comtrade_data results, stored as a pickle file in the front_end/cache data folder
+    so that the trade scripts and their reruns do not merge the same data again.
+    The cache is considered stale after an update of the Faostat crop_trade or Comtrade yearly tables,
+    or after BIOTRADE_CACHE_TTL seconds (env variable, default 1 day)
+
+    :param faostat_code (list), list of product codes to be retrieved
+    :param dataframe comtrade_regulation: comtrade regulation codes to be loaded and aggregated, default is None
+    :param boolean aggregate: data are aggregated or not by product code, default is True
+    :return df (DataFrame), dataframe with merged data
+
+    """
+    return cached_data(
+        "merge_faostat_comtrade",
+        lambda: _merge_cache_key(faostat_code, comtrade_regulation, aggregate),
+        lambda: merge_faostat_comtrade_data(
+            faostat_code, comtrade_regulation, aggregate
+        ),
+    )
+
+
+def _merge_cache_key(faostat_code, comtrade_regulation, aggregate):
+    """
+    Key of the cache file of merged Faostat and Comtrade data, depending on the arguments
+    of merge_faostat_comtrade_data and on the state of the Faostat and Comtrade tables
+
+    :param faostat_code (list), list of product codes to be retrieved
+    :param dataframe comtrade_regulation: comtrade regulation codes to be loaded and aggregated
+    :param boolean aggregate: data are aggregated or not by product code
+    :return key (tuple), arguments in a reproducible form and table states
+
+    """
+    faostat_key = sorted(faostat_code) if faostat_code is not None else None
+    regulation_key = None
+    if comtrade_regulation is not None:
+        regulation_key = (
+            comtrade_regulation.sort_values(comtrade_regulation.columns.tolist())
+            .astype(str)
+            .to_csv(index=False)
+        )
+    return (
+        faostat_key,
+        regulation_key,
+        aggregate,
+        table_state(faostat.db, "crop_trade"),
+        table_state(comtrade.db, "yearly"),
+    )
+
+
+def table_state(db, table):
+    """
+    State of a db table which is part of the cache file keys, so that the cache files are computed
+    again after an update of the table. The query scans the table once, without loading its rows
+
+    :param db (Database), faostat.db or comtrade.db
+    :param table (str), name of the table
+    :return state (tuple), number of rows, most recent year and sum of the value columns of the table
+
+    """
+    table = db.tables[table]
+    value_cols = [
+        col for col in ["value", "trade_value", "net_weight"] if col in table.c
+    ]
+    stmt = select(
+        func.count(),
+        func.max(table.c.year),
+        *[func.sum(table.c[col]) for col in value_cols],
+    ).select_from(table)
+    with db.engine.connect() as conn:
+        return tuple(conn.execute(stmt).one())
+
+
+def cached_regulation_trade_data():
+    """
+    Return the trade data of the regulation and commodity tree products shared by the average and
+    annual variation trade scripts: merged Faostat and Comtrade data without the products in
+    heads, with categorical source, element, unit and country names, narrower integer codes and
+    years, and the french territories aggregated to France. Stored as a pickle file in the
+    front_end/cache data folder, so that each script does not prepare the same data again.
+    The file is prepared again after an update of the trade tables or a change of the code
+
+    :return trade_data (DataFrame), prepared trade data
+
+    """
+    # Obtain faostat product codes
+    faostat_list = main_product_list(["crop_trade"])
+    # Obtain comtrade regulation codes
+    comtrade_regulation = comtrade_products()
+
+    def prepare_trade_data():
+        # Trade data related to product code list
+        trade_data = cached_merge_faostat_comtrade_data(
+            faostat_list, comtrade_regulation, aggregate=False
+        )
+        # Remove trade products where unit is heads
+        trade_data = trade_data[trade_data.unit != "Head"].reset_index(drop=True)
+        # Encode the string key columns as categories, so that the following groupby
+        # and filters operate on integer codes
+        trade_data = trade_data.astype(
+            {"source": "category", "element": "category", "unit": "category"}
+        )
+        # Use narrower integer codes and years. Values stay float64 because
+        # agg_trade_eu_row checks that aggregated sums match the input sums
+        trade_data = downcast_numeric_columns(
+            trade_data,
+            ["reporter_code", "partner_code", "product_code", "year", "period"],
+        )
+        # Aggregate french territories values to France and add them to the dataframe
+        agg_country_code = 68
+        trade_data = aggregated_data(
+            trade_data,
+            FRANCE_TERRITORY_CODES,
+            agg_country_code,
+            country_names()[agg_country_code],
+        )
+        # Encode also the country names used by the EU and ROW aggregations (aggregated_data
+        # assigns new names to them, so they are converted only here)
+        return trade_data.astype({"reporter": "category", "partner": "category"})
+
+    return cached_data(
+        "regulation_trade_data",
+        lambda: _merge_cache_key(faostat_list, comtrade_regulation, False),
+        prepare_trade_data,
+    )
+
+
+def cached_select_country_data(table, drop_zero_values=False, **kwargs):
+    """
+    Return select_country_data results, stored as a pickle file in the front_end/cache data folder
+    so that the scripts and their reruns do not query the db again for the same data.
+    The cache is considered stale after an update of the table or after BIOTRADE_CACHE_TTL seconds
+    (env variable, default 1 day)
+
+    :param table (str), name of the Faostat table to select from
+    :param drop_zero_values (Boolean), if True rows with zero values are also dropped. Default is False
+    :param kwargs, other arguments passed to faostat.db.select
+    :return df (DataFrame), filtered data
+
+    """
+
+    def cache_key():
+        # Key of the cache file depending on the arguments, list arguments in any order,
+        # and on the state of the table
+        kwargs_key = sorted(
+            (name, sorted(value) if isinstance(value, list) else value)
+            for name, value in kwargs.items()
+        )
+        return (table, drop_zero_values, kwargs_key, table_state(faostat.db, table))
+
+    return cached_data(
+        f"select_{table}",
+        cache_key,
+        lambda: select_country_data(table, drop_zero_values, **kwargs),
+    )
+
+
+def cached_data(name, key, compute):
+    """
+    Return the data frame computed by compute(), stored as a pickle file in the front_end/cache data folder
+    when the BIOTRADE_CACHE env variable is set. Otherwise the data frame is computed at each call.
+    The file name contains a hash of the key and of the code version, and the file is computed again after
+    BIOTRADE_CACHE_TTL seconds (env variable, default 1 day)
+
+    :param name (str), prefix of the cache file name
+    :param key (function), function without arguments returning the arguments and table states
+        identifying the data, its repr is hashed. It is called only when the cache is used
+    :param compute (function), function without arguments returning the data frame
+    :return df (DataFrame), cached or computed data
+
+    """
+    if not os.environ.get("BIOTRADE_CACHE"):
+        return compute()
+    key = hashlib.sha1(repr((key(), _code_version())).encode()).hexdigest()
+    cache_dir = data_dir / "front_end" / "cache"
+    cache_file = cache_dir / f"{name}_{key}.pkl"
+    cache_ttl = float(os.environ.get("BIOTRADE_CACHE_TTL", 24 * 60 * 60))
+    if cache_file.exists() and time.time() - os.path.getmtime(cache_file) < cache_ttl:
+        return pd.read_pickle(cache_file)
+    df = compute()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so that scripts running concurrently never read a
+    # partially written cache file
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    df.to_pickle(tmp_file)
+    os.replace(tmp_file, cache_file)
+    return df
+
+
+@lru_cache(maxsize=1)
+def _code_version():
+    """
+    Hash of the source files of the front end functions and of the Faostat and Comtrade merge,
+    part of the cache file keys so that the cache files are computed again after a code change
+
+    :return version (str), hash of the source files
+
+    """
+    sha1 = hashlib.sha1()
+    for file_name in [__file__, inspect.getfile(merge_faostat_comtrade)]:
+        sha1.update(Path(file_name).read_bytes())
+    return sha1.hexdigest()
+
+
+def _percentage(value, total):
+    """
+    Percentage of value over total, multiplying the ratio in place to avoid allocating
+    a second temporary array
+
+    :param value (Series), values
+    :param total (Series), totals of the values
+    :return percentage (array), value / total * 100
+
+    """
+    # Zero totals give nan or inf values silently, like the division of pandas series
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentage = value.to_numpy(dtype="float64") / total.to_numpy(dtype="float64")
+    percentage *= 100
+    return percentage
+
+
+def _average_percentage_results(df, threshold, dict, index_list):
+    """
+    Compute for one dict of average_results the average, total and percentage values, with the
+    percentages above the threshold grouped in the "Others" category
+
+    :param df (DataFrame), data with the period column to perform calculations
+    :param threshold (int), percentage above which classifying as "Others" the percentages
+    :param dict (dict), column names for the aggregation and the percentages, code for the "Others" category and columns to be added to the group by aggregation
+    :param index_list (list), default columns of the group by aggregations
+    :return df_new (DataFrame), results of the calculations
+
+    """
+    index_list_upd = [
+        dict["average_col"],
+        *index_list,
+        *dict["index_list_add"],
+    ]
+    average_col_name = dict["average_col"] + COLUMN_AVG_SUFFIX
+    total_col_name = dict["average_col"] + COLUMN_TOT_SUFFIX
+    percentage_col_name = dict["percentage_col"] + COLUMN_PERC_SUFFIX
+    other_code = dict["threshold_code"]
+    # For the aggregation column calculate mean and sum of the values in the given period aggregation, related to a specific unit and element.
+    # The mean is computed from the yearly sums (in year order)
+    df_stats = (
+        df.groupby([*index_list_upd, "year"], observed=True)["value"]
+        .sum()
+        .groupby(level=index_list_upd, observed=True)
+        .mean()
+        .to_frame(average_col_name)
+    )
+    # The total is the sum of the values, not of the yearly sums which can differ in the last
+    # digits and change the percentages compared with the threshold
+    df_stats[total_col_name] = df.groupby(index_list_upd, observed=True)["value"].sum()
+    df_stats.reset_index(inplace=True)
+    # Percentage column aggregated with the column list
+    df_new = df.groupby(
+        [*index_list_upd, dict["percentage_col"]], observed=True, as_index=False
+    ).agg({"value": "sum"})
+    # Merge with mean and total values
+    df_new = df_new.merge(df_stats, how="left", on=index_list_upd)
+    # Percentage associated to the percentage column on a given aggregated period
+    df_new[percentage_col_name] = _percentage(df_new["value"], df_new[total_col_name])
+    # Sort by percentage, compute the cumulative sum and shift it by one
+    df_new.sort_values(
+        by=[*index_list_upd, percentage_col_name],
+        ascending=False,
+        inplace=True,
+        ignore_index=True,
+    )
+    # Skip nan values is True for cumsum by default
+    df_new["cumsum"] = df_new.groupby(index_list_upd, observed=True)[
+        percentage_col_name
+    ].cumsum()
+    # Rows are sorted by group, so the lag is the cumsum of the previous row, except
+    # on the first row of each group (where the key changes) where it is zero
+    group_start = df_new[index_list_upd].ne(df_new[index_list_upd].shift()).any(axis=1)
+    df_new["cumsum_lag"] = df_new["cumsum"].shift(fill_value=0).where(~group_start, 0)
+    # Create a grouping variable instead of the percentage column, which will be 'Others' for
+    # values above the threshold
+    percentage_col = df_new[dict["percentage_col"]]
+    # Categorical columns need the 'Others' code as a category
+    if isinstance(percentage_col.dtype, pd.CategoricalDtype):
+        if other_code not in percentage_col.cat.categories:
+            percentage_col = percentage_col.cat.add_categories(other_code)
+    df_new[dict["percentage_col"]] = percentage_col.where(
+        df_new["cumsum_lag"] < threshold, other_code
+    )
+    # Group the percentage column values which are in the 'Others' category and calculate their percentage
+    df_new = df_new.groupby(
+        [*index_list_upd, dict["percentage_col"]], observed=True, as_index=False
+    ).agg(
+        {
+            "value": "sum",
+            average_col_name: "first",
+            total_col_name: "first",
+        }
+    )
+    df_new[percentage_col_name] = _percentage(df_new["value"], df_new[total_col_name])
+    return df_new
+
+
 def average_results(df, threshold, dict_list, interval_array=np.array([])):
     """
     Script which produce the average and percentage results for the tree maps of the web platform
@@ -284,126 +864,52 @@ def average_results(df, threshold, dict_list, interval_array=np.array([])):
     :return df_final (DataFrame), where calculations are performed
 
     """
-    # Make a copy of df to avoid overrides
-    df = df.copy()
-    # Query df to obtain most recent year of data
-    most_recent_year = sorted(df.year.unique(), reverse=True)[0]
-    # Consider all the years of the table except the most recent (no aggregation for it)
-    years = sorted(df.year.unique(), reverse=True)[1:]
+    # Default index list for aggregations + the adds from the arguments
+    index_list = ["element", "period", "unit"]
+    # Keep only the columns used by the calculations, so that the unused columns are not
+    # moved through the aggregations. The selection is a copy, avoiding overrides of df
+    column_list = ["element", "unit", "year", "value"]
+    column_list += ["product_code", "reporter_code", "partner_code"]
+    for dict in dict_list:
+        column_list += [dict["average_col"], dict["percentage_col"]]
+        column_list += dict["index_list_add"]
+    df = df.loc[:, [col for col in df.columns if col in column_list]]
+    # Sorted years of the table, the most recent year is not aggregated (period 0)
+    years = np.sort(df["year"].unique())
     # Define aggregation of 5 years at a time, starting from the most recent year - 1
-    periods = np.array(range(0, len(years))) // 5 + 1
-    # Construct the df_periods containing the periods yyyy-yyyy and merge it with df
-    df_periods = pd.DataFrame(
-        {
-            "year": [most_recent_year, *years],
-            "period_aggregation": [0, *periods],
-        }
-    )
-    # Define the min year inside each period
-    df_periods_min = (
-        df_periods.groupby(["period_aggregation"]).agg({"year": "min"}).reset_index()
-    )
-    # Define the max year inside each period
-    df_periods_max = (
-        df_periods.groupby(["period_aggregation"]).agg({"year": "max"}).reset_index()
-    )
-    # Merge on the periods
-    df_periods = df_periods.merge(
-        df_periods_min,
-        how="left",
-        on="period_aggregation",
-        suffixes=("", "_min"),
+    period_codes = np.concatenate(([0], np.arange(len(years) - 1) // 5 + 1))[::-1]
+    # Years are sorted, so each period is a contiguous block of years. Define the
+    # structure yyyy-yyyy of the periods, in chronological (and alphabetical) order,
+    # from the first and last years of the blocks
+    period_starts = np.flatnonzero(np.diff(period_codes, prepend=-1))
+    period_ends = np.append(period_starts[1:], len(years)) - 1
+    period_labels = np.char.add(
+        np.char.add(years[period_starts].astype(str), "-"),
+        years[period_ends].astype(str),
     )
-    df_periods = df_periods.merge(
-        df_periods_max,
-        how="left",
-        on="period_aggregation",
-        suffixes=("", "_max"),
+    # Assign the associated period to each data, looking up the position of its year.
+    # Periods are categories, so that the groupby aggregations hash integer codes with
+    # the same sort order as the labels
+    max_code = period_codes.max()
+    df["period"] = pd.Categorical.from_codes(
+        max_code - period_codes[np.searchsorted(years, df["year"].to_numpy())],
+        categories=period_labels.astype(object),
     )
-    # Define the structure yyyy-yyyy for the period aggregation column
-    df_periods["period_aggregation"] = (
-        df_periods["year_min"].astype(str) + "-" + df_periods["year_max"].astype(str)
-    )
-    # Assign the associated period to each data
-    df = df.merge(df_periods[["year", "period_aggregation"]], on="year", how="left")
-    df["period"] = df["period_aggregation"]
-    # Default index list for aggregations + the adds from the arguments
-    index_list = ["element", "period", "unit"]
     df_final = pd.DataFrame()
     column_drop = []
-    # Load for each dict the aggregation column, the percentage column and the code for threshold values in order to compute calculations
+    # Load for each dict the aggregation column, the percentage column and the new results to combine them
     for dict in dict_list:
+        df_new = _average_percentage_results(df, threshold, dict, index_list)
         index_list_upd = [
             dict["average_col"],
             *index_list,
             *dict["index_list_add"],
         ]
-        value_col_name = "value"
         average_col_name = dict["average_col"] + COLUMN_AVG_SUFFIX
         total_col_name = dict["average_col"] + COLUMN_TOT_SUFFIX
-        percentage_col_name = dict["percentage_col"] + COLUMN_PERC_SUFFIX
-        other_code = dict["threshold_code"]
-        # For the aggregation column calculate mean and sum of the values in the given period aggregation, related to a specific unit and element
-        df_mean = (
-            df.groupby([*index_list_upd, "year"])
-            .agg({"value": "sum"})
-            .reset_index()
-            .groupby(index_list_upd)
-            .agg({"value": "mean"})
-            .reset_index()
-            .rename(columns={"value": average_col_name})
-        )
-        df_total = (
-            df.groupby(index_list_upd)
-            .agg({"value": "sum"})
-            .reset_index()
-            .rename(columns={"value": total_col_name})
-        )
-        if total_col_name not in column_drop:
-            column_drop.append(total_col_name)
-        # Percentage column aggregated with the column list
-        df_new = (
-            df.groupby([*index_list_upd, dict["percentage_col"]])
-            .agg({"value": "sum"})
-            .reset_index()
-        )
-        if value_col_name not in column_drop:
-            column_drop.append(value_col_name)
-        # Merge with mean and total values
-        df_new = df_new.merge(df_mean, how="left", on=index_list_upd)
-        df_new = df_new.merge(df_total, how="left", on=index_list_upd)
-        # Percentage associated to the percentage column on a given aggregated period
-        df_new[percentage_col_name] = df_new["value"] / df_new[total_col_name] * 100
-        # Sort by percentage, compute the cumulative sum and shift it by one
-        df_new.sort_values(
-            by=[*index_list_upd, percentage_col_name],
-            ascending=False,
-            inplace=True,
-            ignore_index=True,
-        )
-        # Skip nan values is True for cumsum by default
-        df_new["cumsum"] = df_new.groupby(index_list_upd)[percentage_col_name].cumsum()
-        df_new["cumsum_lag"] = df_new.groupby(index_list_upd)["cumsum"].transform(
-            "shift", fill_value=0
-        )
-        # Create a grouping variable instead of the percentage column, which will be 'Others' for
-        # values above the threshold
-        df_new[dict["percentage_col"]] = df_new[dict["percentage_col"]].where(
-            df_new["cumsum_lag"] < threshold, other_code
-        )
-        # Group the percentage column values which are in the 'Others' category and calculate their percentage
-        df_new = (
-            df_new.groupby([*index_list_upd, dict["percentage_col"]])
-            .agg(
-                {
-                    "value": "sum",
-                    average_col_name: "first",
-                    total_col_name: "first",
-                }
-            )
-            .reset_index()
-        )
-        df_new[percentage_col_name] = df_new["value"] / df_new[total_col_name] * 100
+        for col in [total_col_name, "value"]:
+            if col not in column_drop:
+                column_drop.append(col)
         if df_final.empty:
             df_final = df_new
         else:
@@ -441,77 +947,58 @@ def average_results(df, threshold, dict_list, interval_array=np.array([])):
         groupby_avg_cols.append("partner_code")
     # Calculate the average over time
     df_avg = (
-        df.groupby(groupby_avg_cols)
+        df.groupby(groupby_avg_cols, observed=True, as_index=False)
         .agg({"value": "mean"})
-        .reset_index()
         .rename(columns={"value": "avg_value"})
     )
     if len(interval_array):
         # Extract max value avg production for a commodity across periods and countries
         groupby_max_cols = ["product_code", "element", "unit"]
         df_max = (
-            df_avg.groupby(groupby_max_cols)
+            df_avg.groupby(groupby_max_cols, observed=True, as_index=False)
             .agg({"avg_value": "max"})
-            .reset_index()
             .rename(columns={"avg_value": "max_avg_value"})
         )
         df_avg = df_avg.merge(df_max, how="left", on=groupby_max_cols)
         # Compute thresholds: [interval_array] * df["max_avg_value"]
-        df_avg["bin"] = (
-            df_avg["max_avg_value"].values.reshape(len(df_avg), 1)
-            * np.array([interval_array])
-        ).tolist()
-        # For each group (product, element, unit) define to which interval the average production of the specific country and period belongs
-        df_groups = df_avg.groupby(groupby_max_cols)
-        df_avg = pd.DataFrame()
-        df_legend = pd.DataFrame()
-        for key in df_groups.groups.keys():
-            df_key = df_groups.get_group(key).reset_index(drop=True)
-            key_legend = pd.DataFrame()
-            bins = df_key.bin[0]
-            # If no max_avg_production defined, then put nan
-            if df_key.max_avg_value.isnull().all():
-                df_key["interval"] = pd.cut(
-                    df_key["avg_value"],
-                    bins=bins,
-                    duplicates="drop",
-                )
-            # Assign the intervals and ranges
-            elif len(df_key.max_avg_value.unique()) == 1:
-                df_key["interval"] = pd.cut(
-                    df_key["avg_value"],
-                    bins=bins,
-                    labels=list(range(0, len(interval_array) - 1)),
-                )
-                df_key["interval_range"] = pd.cut(
-                    df_key["avg_value"],
-                    bins=bins,
-                )
-                key_legend["interval"] = df_key["interval"].cat.categories.values
-                key_legend["min_value"] = df_key["interval_range"].cat.categories.left
-                key_legend["max_value"] = df_key["interval_range"].cat.categories.right
-                key_legend["product_code"] = key[0]
-                key_legend["element"] = key[1]
-                key_legend["unit"] = key[2]
-            # Inconsistencies could be detected with the warning
-            else:
-                faostat.db.logger.warning(
-                    f"The dataset represented by {groupby_max_cols} = {key} tuple has not been included into the final csv file due to inconsistencies, please check the data."
-                )
-                continue
-            # Concat to obtain updated dataframes
-            df_legend = pd.concat(
-                [df_legend, key_legend],
-                ignore_index=True,
-            )
-            df_avg = pd.concat(
-                [df_avg, df_key[[*groupby_avg_cols, "avg_value", "interval"]]],
-                ignore_index=True,
-            )
+        bins = df_avg["max_avg_value"].to_numpy()[:, np.newaxis] * interval_array
+        # Define to which interval the average production of the specific country and
+        # period belongs, vectorised over all the groups (product, element, unit): as
+        # with pd.cut (right closed intervals), the interval is the number of thresholds
+        # below the value - 1. Values not above the first threshold or above the last
+        # one, nan values and groups without max_avg_value get a nan interval
+        values = df_avg["avg_value"].to_numpy()
+        codes = (bins < values[:, np.newaxis]).sum(axis=1) - 1
+        codes[~(values <= bins[:, -1])] = -1
+        interval_list = np.arange(len(interval_array) - 1)
+        df_avg["interval"] = pd.Categorical.from_codes(
+            codes, categories=interval_list, ordered=True
+        )
+        df_avg = df_avg[[*groupby_avg_cols, "avg_value", "interval"]]
+        # Legend with the range of each interval, for the groups with a max_avg_value.
+        # The ranges are the interval categories of pd.cut, with its rounded breaks
+        df_max = df_max[df_max["max_avg_value"].notna()]
+        bins = df_max["max_avg_value"].to_numpy()[:, np.newaxis] * interval_array
+        interval_ranges = [
+            pd.cut([], bins=group_bins).categories for group_bins in bins
+        ]
+        df_legend = pd.DataFrame(
+            {
+                "interval": np.tile(interval_list, len(df_max)),
+                "min_value": np.concatenate(
+                    [ranges.left for ranges in interval_ranges]
+                ),
+                "max_value": np.concatenate(
+                    [ranges.right for ranges in interval_ranges]
+                ),
+                **{
+                    col: df_max[col].to_numpy().repeat(len(interval_list))
+                    for col in groupby_max_cols
+                },
+            }
+        )
         # Columns to keep in the legend dataframe
-        drop_column = "element"
-        column_list = df_legend.columns.tolist()
-        column_list.remove(drop_column)
+        column_list = df_legend.columns.drop("element").tolist()
         # Save interval legends
         harvested_area_legend = df_legend[df_legend["element"] == "area_harvested"][
             column_list
@@ -596,6 +1083,44 @@ def average_results(df, threshold, dict_list, interval_array=np.array([])):
     return df_final
 
 
+def _sum_by_group(df, groupby_cols, value_cols):
+    """
+    Sum the value columns by group, with the numpy summation of Series.sum
+
+    The cython groupby sum uses a compensated summation which can differ in the
+    last digit from the per group Series.sum(min_count=1) aggregation. The rows of
+    each group are taken in their original order and summed with numpy instead.
+
+    :param df (DataFrame), data to be aggregated
+    :param groupby_cols (list), columns to consider for the groupby function
+    :param value_cols (list), columns on which to calculate the sum
+    :return df_sum (DataFrame), one row by group in sorted group order. If all
+        values of a group are null, the sum is NaN instead of 0
+
+    """
+    group_codes = df.groupby(groupby_cols, observed=True).ngroup().to_numpy()
+    # Stable sort, the rows of each group keep their original order. Rows with null
+    # group keys have code -1 and are dropped like in the groupby
+    order = np.argsort(group_codes, kind="stable")
+    order = order[group_codes[order] >= 0]
+    sorted_codes = group_codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+    df_sum = df[groupby_cols].iloc[order[starts]].reset_index(drop=True)
+    for col in value_cols:
+        values = df[col].to_numpy()[order]
+        not_null = ~pd.isna(values)
+        groups = (
+            np.split(np.where(not_null, values, 0), starts[1:]) if len(starts) else []
+        )
+        df_sum[col] = np.array([group.sum() for group in groups])
+        # If all null values, do not return 0 but Nan
+        if len(starts):
+            all_null = np.add.reduceat(not_null, starts) == 0
+            if all_null.any():
+                df_sum[col] = df_sum[col].where(~all_null)
+    return df_sum
+
+
 def aggregated_data(
     df,
     code_list,
@@ -626,85 +1151,55 @@ def aggregated_data(
     """
     # Trade data
     if "partner_code" in df.columns:
-        # Define aggregated data both for reporter and partner
-        df_agg = df[df[["reporter_code", "partner_code"]].isin(code_list).any(axis=1)]
-        # Avoid counting internal trades
-        mask = (df_agg.reporter_code.isin(code_list)) & (
-            df_agg.partner_code.isin(code_list)
-        )
-        df_agg = df_agg[~mask]
+        # Boolean arrays of the reporter and partner codes in the code list, computed
+        # once and combined for all the selections below
+        in_code_list = df[["reporter_code", "partner_code"]].isin(code_list).to_numpy()
+        in_any_side = in_code_list.any(axis=1)
+        # Nothing to aggregate, avoid copying df in the selections and the concatenation
+        if not in_any_side.any():
+            return df.set_axis(pd.RangeIndex(len(df)), copy=False)
+        # Define aggregated data both for reporter and partner, avoiding internal trades
+        agg_selector = in_any_side & ~in_code_list.all(axis=1)
+        df_agg = df[agg_selector]
+        in_code_list = in_code_list[agg_selector]
         # Remove country code list data from df dataset
-        df = df[~(df[["reporter_code", "partner_code"]].isin(code_list)).any(axis=1)]
-        # Aggregation on the reporter side
-        df_agg_1 = (
-            df_agg[df_agg["reporter_code"].isin(code_list)]
-            .groupby(
-                [
-                    *groupby_cols,
-                    "source",
-                    "partner_code",
-                    "partner",
-                ]
-            )
-            # If all null values, do not return 0 but Nan
-            .agg({col: lambda x: x.sum(min_count=1) for col in value_cols})
-            .reset_index()
+        df = df[~in_any_side]
+        # Internal trades are removed, so each row is aggregated on one side only:
+        # reporter side rows are grouped by partner and partner side rows by reporter
+        on_reporter_side = in_code_list[:, 0]
+        df_agg_1 = _sum_by_group(
+            df_agg[on_reporter_side],
+            [*groupby_cols, "source", "partner_code", "partner"],
+            value_cols,
         )
         df_agg_1["reporter_code"] = agg_country_code
         df_agg_1["reporter"] = agg_country_name
-        # Concat with reporter codes not in country code list
-        df_agg_1 = pd.concat(
-            [df_agg[~df_agg["reporter_code"].isin(code_list)], df_agg_1],
-            ignore_index=True,
-        )
-        # Aggregation also on the partner side
-        df_agg_2 = (
-            df_agg_1[df_agg_1["partner_code"].isin(code_list)]
-            .groupby(
-                [
-                    *groupby_cols,
-                    "source",
-                    "reporter_code",
-                    "reporter",
-                ]
-            )
-            # If all null values, do not return 0 but Nan
-            .agg({col: lambda x: x.sum(min_count=1) for col in value_cols})
-            .reset_index()
+        df_agg_2 = _sum_by_group(
+            df_agg[~on_reporter_side],
+            [*groupby_cols, "source", "reporter_code", "reporter"],
+            value_cols,
         )
         df_agg_2["partner_code"] = agg_country_code
         df_agg_2["partner"] = agg_country_name
-        # Concat with partner codes not in country code list
-        df_agg_2 = pd.concat(
-            [
-                df_agg_1[~df_agg_1["partner_code"].isin(code_list)],
-                df_agg_2,
-            ],
-            ignore_index=True,
-        )
-        df_agg = df_agg_2
+        df_agg = concat_non_empty([df_agg_1, df_agg_2])
     # Production data
     else:
-        # Produce reporter aggregated data
-        df_agg = df[df["reporter_code"].isin(code_list)]
+        # Produce reporter aggregated data, only the rows of the code list are grouped
+        in_code_list = df["reporter_code"].isin(code_list).to_numpy()
+        # Nothing to aggregate, avoid copying df in the selections and the concatenation
+        if not in_code_list.any():
+            return df.set_axis(pd.RangeIndex(len(df)), copy=False)
+        df_agg = df[in_code_list]
         # Remove country code list data from df dataset
-        df = df[~(df["reporter_code"].isin(code_list))]
-        df_agg = (
-            df_agg.groupby([*groupby_cols])
-            # If all null values, do not return 0 but Nan
-            .agg(
-                {col: lambda x: x.sum(min_count=1) for col in value_cols}
-            ).reset_index()
-        )
+        df = df[~in_code_list]
+        df_agg = _sum_by_group(df_agg, groupby_cols, value_cols)
         df_agg["reporter_code"] = agg_country_code
         df_agg["reporter"] = agg_country_name
     # Fill period column
     df_agg["period"] = df_agg["year"]
-    # Build the final dataset to return
-    df = pd.concat(
-        [df, df_agg],
-        ignore_index=True,
-    )
+    # Build the final dataset to return, without concatenating an empty df when all
+    # the rows are aggregated
+    df = concat_non_empty([df, df_agg])
     return df
 
 
@@ -0,0 +1,66 @@
+"""
+Copyright (c) 2023 European Union
+Licenced under the MIT licence
+
+Script made to run all the export scripts of the web platform data, each one in its own process,
+so that the db queries of one script overlap with the calculations of the others
+
+    python -m scripts.front_end.run_all
+
+Set the BIOTRADE_CACHE env variable to share the merged trade data and the db selections
+between the scripts through cache files. The merged trade data is prepared once before the
+scripts start, so that the trade scripts do not all merge it on a cache miss. The db
+selections shared by the harvested area scripts can still be read twice on an empty cache.
+The scripts print their messages at the same time, so their output is interleaved. The
+main process reports each completed script
+
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.front_end import (
+    annual_variation_harvested_area_production,
+    annual_variation_trade_quantity_value,
+    average_harvested_area_production,
+    average_trade_quantity,
+    product_list,
+    trends_harvested_area_production,
+    trends_trade_quantity,
+)
+from scripts.front_end.functions import cached_regulation_trade_data
+
+# Scripts with a main function, independent from each other
+SCRIPT_LIST = [
+    product_list,
+    annual_variation_harvested_area_production,
+    annual_variation_trade_quantity_value,
+    average_harvested_area_production,
+    average_trade_quantity,
+    trends_harvested_area_production,
+    trends_trade_quantity,
+]
+
+
+def main(max_workers=3):
+    """
+    Run the main function of each script of SCRIPT_LIST in a pool of processes
+
+    :param max_workers (int), number of scripts running at the same time
+
+    """
+    # Prepare the trade data shared by the average and annual variation trade scripts
+    # before starting the processes, they then read it from the cache file
+    if os.environ.get("BIOTRADE_CACHE"):
+        cached_regulation_trade_data()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(script.main): script for script in SCRIPT_LIST}
+        # Raise possible errors of the scripts
+        for future, script in futures.items():
+            future.result()
+            print(f"Completed {script.__name__}")
+
+
+# Needed to avoid running module when imported
+if __name__ == "__main__":
+    main()
@@ -11,16 +11,20 @@ Script made to export trends related to harvested area/production of countries a
 
 def main():
     import sys
-    from biotrade.faostat import faostat
+    from concurrent.futures import ThreadPoolExecutor
     import pandas as pd
     import numpy as np
     from scripts.front_end.functions import (
+        FRANCE_TERRITORY_CODES,
         aggregated_data,
+        country_names,
+        drop_zero_nan_values,
         main_product_list,
+        cached_select_country_data,
         reporter_iso_codes,
         replace_zero_with_nan_values,
         trend_analysis,
-        save_file,
+        save_files,
     )
 
     # Default is using multi process
@@ -34,30 +38,32 @@ def main():
         ["crop_production", "forestry_production"]
     )
     # Select quantities from Faostat db for crop data for all countries (code < 1000)
-    crop_data = faostat.db.select(
-        table="crop_production",
-        product_code=main_product_list,
-        element=["production", "area_harvested", "stocks"],
-    )
-    # Select wood production data
-    wood_data = faostat.db.select(
-        table="forestry_production",
-        product_code=main_product_list,
-        element=["production"],
-    )
+    # and wood production data. The two queries are independent, run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        crop_future = executor.submit(
+            cached_select_country_data,
+            "crop_production",
+            product_code=main_product_list,
+            element=["production", "area_harvested", "stocks"],
+        )
+        wood_future = executor.submit(
+            cached_select_country_data,
+            "forestry_production",
+            product_code=main_product_list,
+            element=["production"],
+        )
+    crop_data, wood_data = crop_future.result(), wood_future.result()
     # Merge data
     crop_data = pd.concat([crop_data, wood_data], ignore_index=True)
     # Filter crop_data with the common most recent year of the several element types
-    most_recent_year = crop_data.groupby("element")["year"].max().min()
+    most_recent_year = (
+        crop_data.groupby("element", sort=False, observed=True)["year"].max().min()
+    )
     crop_data = crop_data[crop_data.year <= most_recent_year]
-    crop_data = crop_data[crop_data["reporter_code"] < 1000]
     # Aggregate french territories values to France and add them to the dataframe
-    code_list = [68, 69, 87, 135, 182, 270, 281]
+    code_list = FRANCE_TERRITORY_CODES
     agg_country_code = 68
-    agg_country_name = faostat.country_groups.df
-    agg_country_name = agg_country_name[
-        agg_country_name.faost_code == agg_country_code
-    ].fao_table_name.values[0]
+    agg_country_name = country_names()[agg_country_code]
     crop_data = aggregated_data(
         crop_data, code_list, agg_country_code, agg_country_name
     )
@@ -82,7 +88,9 @@ def main():
     ]
     # Drop nan values
     dropna_col = ["relative_change", "absolute_change", "mk_slope"]
-    df = replace_zero_with_nan_values(df, dropna_col)
+    # Drop rows without any value first, then replace the remaining zeros with nan
+    df = drop_zero_nan_values(df, dropna_col, how="all")
+    df = replace_zero_with_nan_values(df.copy(), dropna_col)
     # Put nan to period and significance columns when relative change or slope is 0
     # To avoid inconsistencies during the replace zero with nan
     selector = df.mk_slope.isnull()
@@ -90,9 +98,10 @@ def main():
     df.loc[selector, "mk_significance_flag"] = np.nan
     selector = df.relative_change.isnull() & df.absolute_change.isnull()
     df.loc[selector, "period_change"] = np.nan
-    df = df.dropna(subset=dropna_col, how="all")
     # Harvested area data (only the most common recent year of db)
-    most_recent_year = df.groupby("element")["year"].max().min()
+    most_recent_year = (
+        df.groupby("element", sort=False, observed=True)["year"].max().min()
+    )
     harvested_area = df[
         (df["element"] == "area_harvested") & (df["year"] == most_recent_year)
     ][column_list]
@@ -101,8 +110,12 @@ def main():
         (df["element"].isin(["production", "stocks"]))
         & (df["year"] == most_recent_year)
     ][column_list]
-    save_file(harvested_area, "harvested_area_trends.csv")
-    save_file(production, "production_trends.csv")
+    save_files(
+        [
+            (harvested_area, "harvested_area_trends.csv"),
+            (production, "production_trends.csv"),
+        ]
+    )
 
 
 # Needed to avoid running module when imported
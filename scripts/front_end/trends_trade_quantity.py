@@ -7,32 +7,39 @@ Licenced under the MIT licence
 Script made to export trends related to bilateral trades of countries associated to palm oil, soybeans, cocoa beans, coffee roasted, meat cattle, hides cattle fresh
 """
 
-# Needed for multiprocessing tool, otherwise Windows spawns multiple threads
-if __name__ == "__main__":
-    from functions import *
+
+def main():
+    import numpy as np
+    from scripts.front_end.functions import (
+        aggregated_data,
+        cached_merge_faostat_comtrade_data,
+        country_names,
+        drop_zero_nan_values,
+        reporter_iso_codes,
+        replace_zero_with_nan_values,
+        save_files,
+        trend_analysis,
+    )
 
     # Selected product codes
     product_list = [236, 238, 257, 657, 661, 867, 919]
     # Trade data related to product code list
-    trade_data = merge_faostat_comtrade_data(product_list)
-    # China Mainland + Taiwan data
-    df_china = consistency_check_china_data(trade_data)
-    # Add China data to trade_data (exclude Taiwan data)
-    trade_data = pd.concat(
-        [
-            trade_data[
-                ~((trade_data[["reporter_code", "partner_code"]] == 214).any(axis=1))
-            ],
-            df_china,
-        ],
-        ignore_index=True,
+    trade_data = cached_merge_faostat_comtrade_data(product_list)
+    # Consider data after 1985 to calculate trends of last year (excluded estimated values,
+    # flagged as "estimate" by the merge). Filter before the China aggregation, which does
+    # not keep the flag column
+    trade_data = trade_data[
+        (trade_data["year"] > 1985) & (trade_data["flag"] != "estimate")
+    ]
+    # Aggregate China Mainland + Taiwan data to China mainland (iso3 code CHN) and
+    # exclude the Taiwan data. Trade between China Mainland and Taiwan is internal to the
+    # aggregate and removed
+    china_code = 41
+    trade_data = aggregated_data(
+        trade_data, [china_code, 214], china_code, country_names()[china_code]
     )
     # Substitute faostat codes with iso3 codes
     trade_data = reporter_iso_codes(trade_data)
-    # Consider data after 1985 to calculate trends of last year (excluded estimated values)
-    trade_data = trade_data[
-        (trade_data["year"] > 1985) & (trade_data["estimate_flag"] == 0)
-    ]
     # Remove unused columns
     trade_data.drop(columns=["product", "element_code"], inplace=True)
     # Perform trend analysis
@@ -53,7 +60,9 @@ if __name__ == "__main__":
     ]
     # Drop nan values
     dropna_col = ["relative_change", "absolute_change", "mk_slope"]
-    df = replace_zero_with_nan_values(df, dropna_col)
+    # Drop rows without any value first, then replace the remaining zeros with nan
+    df = drop_zero_nan_values(df, dropna_col, how="all")
+    df = replace_zero_with_nan_values(df.copy(), dropna_col)
     # Put nan to period and significance columns when relative change or slope is 0
     # To avoid inconsistencies during the replace zero with nan
     selector = df.mk_slope.isnull()
@@ -61,35 +70,43 @@ if __name__ == "__main__":
     df.loc[selector, "mk_significance_flag"] = np.nan
     selector = df.relative_change.isnull()
     df.loc[selector, "period_change"] = np.nan
-    df = df.dropna(subset=dropna_col, how="all")
-    # Define most recent year for faostat and comtrade data
-    trade_data_faostat = df[df["source"] == "faostat"]
-    most_recent_year_faostat = sorted(trade_data_faostat.year.unique(), reverse=True)[0]
-    trade_data_comtrade = df[df["source"] == "comtrade"]
-    most_recent_year_comtrade = sorted(trade_data_comtrade.year.unique(), reverse=True)[
-        0
-    ]
-    # Consider selected columns of import quantities and save the file
+    # Split faostat and comtrade data in a single pass and define their most recent year
+    source_data = dict(tuple(df.groupby("source", sort=False, observed=True)))
+    trade_data_faostat = source_data["faostat"]
+    most_recent_year_faostat = trade_data_faostat.year.max()
+    trade_data_comtrade = source_data["comtrade"]
+    most_recent_year_comtrade = trade_data_comtrade.year.max()
+    # Consider selected columns of import quantities
     trade_data_faostat_reporter = trade_data_faostat[
         (trade_data_faostat["year"] == most_recent_year_faostat)
         & (trade_data_faostat["element"] == "import_quantity")
     ][column_list]
-    save_file(trade_data_faostat_reporter, "faostat_trends.csv")
-    # Consider selected columns of import quantities and save the file
+    # Consider selected columns of import quantities
     trade_data_comtrade_reporter = trade_data_comtrade[
         (trade_data_comtrade["year"] == most_recent_year_comtrade)
         & (trade_data_comtrade["element"] == "import_quantity")
     ][column_list]
-    save_file(trade_data_comtrade_reporter, "comtrade_trends.csv")
-    # Consider selected columns of export quantities and save the file --> mirror flows
+    # Consider selected columns of export quantities --> mirror flows
     trade_data_faostat_partner = trade_data_faostat[
         (trade_data_faostat["year"] == most_recent_year_faostat)
         & (trade_data_faostat["element"] == "export_quantity")
     ][column_list]
-    save_file(trade_data_faostat_partner, "faostat_trends_mf.csv")
-    # Consider selected columns of export quantities and save the file --> mirror flows
+    # Consider selected columns of export quantities --> mirror flows
     trade_data_comtrade_partner = trade_data_comtrade[
         (trade_data_comtrade["year"] == most_recent_year_comtrade)
         & (trade_data_comtrade["element"] == "export_quantity")
     ][column_list]
-    save_file(trade_data_comtrade_partner, "comtrade_trends_mf.csv")
+    # Save the four files concurrently
+    save_files(
+        [
+            (trade_data_faostat_reporter, "faostat_trends.csv"),
+            (trade_data_comtrade_reporter, "comtrade_trends.csv"),
+            (trade_data_faostat_partner, "faostat_trends_mf.csv"),
+            (trade_data_comtrade_partner, "comtrade_trends_mf.csv"),
+        ]
+    )
+
+
+# Needed to avoid running module when imported
+if __name__ == "__main__":
+    main()
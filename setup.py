@@ -39,7 +39,7 @@ setup(
         "matplotlib",
         "comtradeapicall",
     ],
-    extras_require={"api": ["fastapi", "uvicorn"]},
+    extras_require={"api": ["fastapi", "uvicorn"], "parquet": ["pyarrow"]},
     python_requires=">=3.7",
     long_description=readme,
     long_description_content_type="text/markdown",